@@ -0,0 +1,218 @@
+"""Набор замеров производительности симуляции.
+
+Каждый сценарий воспроизводим по зерну: строится мир, затем заданное число шагов
+прогоняется по фазам Simulation.phases() с отдельным замером каждой фазы и World.draw.
+Результаты печатаются таблицей и сохраняются в JSON для сравнения прогонов:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import time
+import tracemalloc
+import pygame
+from config import *
+from simulation import Simulation
+from human import Human, Group
+from settlement import Tribe, City, State
+from resources import Resources
+
+
+# --- Сценарии ---
+HUMAN_SCENARIO_TILES = 100 # клеток на человека: иначе люди почти все уходят в группы на первом же шаге
+
+
+def build_humans(count, batched=False):
+    # Мир растет с населением, сохраняя пропорции экрана
+    scale = max(1.0, (count * HUMAN_SCENARIO_TILES / (GRID_WIDTH * GRID_HEIGHT)) ** 0.5)
+    width, height = round(GRID_WIDTH * scale), round(GRID_HEIGHT * scale)
+
+    def build(seed):
+        sim = Simulation(width, height, seed=seed)
+        if batched: sim.use_population()
+        sim.spawn_humans(count)
+        return sim
+    return build
+
+
+def build_groups(count):
+    def build(seed):
+        sim = Simulation(seed=seed)
+        rng, world = sim.rng, sim.world
+        for _ in range(count):
+            x, y = rng.randrange(world.width), rng.randrange(world.height)
+            group = Group(x, y, [Human(x, y, rng) for _ in range(GROUP_CREATION_MEMBERS)])
+            group.population = rng.randint(GROUP_CREATION_MEMBERS, TRIBE_CREATION_POPULATION - 1)
+            for i in range(len(RESOURCE_TYPES)): group.resources[i] = group.population * rng.randint(1, 5)
+            sim.groups.append(group)
+        return sim
+    return build
+
+
+def add_state(sim, x, y, population, technology_lvl, color):
+    """Государство в (x, y) сразу, минуя стадии группы, племени и города."""
+    group = Group(x, y, [])
+    group.population = population
+    group.resources = Resources(10 * STATE_EXPANSION_COST['wood'] * 50 for res in RESOURCE_TYPES)
+    state = State(City(Tribe(group)), color)
+    state.technology_lvl = technology_lvl
+    sim.settlements.append(state)
+    sim.states.append(state)
+    state.update_territory(sim.world)
+    state.update_border_tiles(sim.world)
+    return state
+
+
+def build_states_at_war(count, warmup=40, strikes=0):
+    def build(seed):
+        sim = Simulation(seed=seed)
+        rng, world = sim.rng, sim.world
+        cols = max(1, int((count * world.width / world.height) ** 0.5))
+        rows = -(-count // cols)
+        for i in range(count):
+            x = (i % cols) * world.width // cols + world.width // cols // 2
+            y = (i // cols) * world.height // rows + world.height // rows // 2
+            color = (rng.randint(50, 255), rng.randint(50, 255), rng.randint(50, 255))
+            add_state(sim, x, y, rng.randint(500, 5000), rng.uniform(1, 50), color)
+        # Разгон: государства расширяются до соприкосновения и объявляют войны
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(warmup): sim.update(TICK_STEP)
+            for _ in range(strikes):
+                target = rng.choice(sim.states) if sim.states else None
+                if target and target.territory:
+                    world.nuclear_explosion(rng.choice(target.territory))
+        return sim
+    return build
+
+
+SCENARIOS = {
+    'humans_500': build_humans(500),
+    'humans_5000': build_humans(5000),
+    'humans_20000': build_humans(20000),
+    'humans_20000_batched': build_humans(20000, batched=True),
+    'groups_200': build_groups(200),
+    'states_war_50': build_states_at_war(50),
+    'post_nuclear': build_states_at_war(50, strikes=10),
+}
+
+
+# --- Замеры ---
+def count_entities(sim):
+    return {
+        'humans': len(sim.humans),
+        'groups': len(sim.groups),
+        'settlements': len(sim.settlements) - len(sim.states),
+        'states': len(sim.states),
+        'wars': sum(status == 'war' for s in sim.states for status in s.diplomacy.values()) // 2,
+    }
+
+
+def run_scenario(name, steps, seed):
+    build = SCENARIOS[name]
+    build_start = time.perf_counter()
+    sim = build(seed)
+    build_time = time.perf_counter() - build_start
+    entities_before = count_entities(sim)
+
+    # Отрисовка замеряется на картах размером с экран: холст большой карты занял бы сотни мегабайт
+    draw = sim.world.width <= GRID_WIDTH and sim.world.height <= GRID_HEIGHT
+    totals = {name: 0.0 for name, _ in sim.phases()}
+    if draw:
+        surface = pygame.Surface((sim.world.width * TILE_SIZE, sim.world.height * TILE_SIZE))
+        sim.world.draw(surface) # первая полная отрисовка не входит в замер
+        totals['draw'] = 0.0
+    entities_per_step = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(steps):
+            sim.tick += TICK_STEP
+            for phase_name, phase in sim.phases():
+                t = time.perf_counter()
+                phase()
+                totals[phase_name] += time.perf_counter() - t
+            if draw:
+                t = time.perf_counter()
+                sim.world.draw(surface)
+                totals['draw'] += time.perf_counter() - t
+            entities_per_step.append(count_entities(sim))
+        # Подсчет сущностей не входит в замер
+        elapsed = sum(totals.values())
+
+    # Пиковая память - отдельным коротким прогоном под tracemalloc, чтобы не искажать время
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        mem_sim = build(seed)
+        for _ in range(min(steps, 5)): mem_sim.update(TICK_STEP)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    sim_time = elapsed - totals.get('draw', 0.0)
+    return {
+        'name': name,
+        'seed': seed,
+        'steps': steps,
+        'world': [sim.world.width, sim.world.height],
+        'build_s': build_time,
+        'elapsed_s': elapsed,
+        'ticks_per_sec': steps / sim_time if sim_time > 0 else float('inf'),
+        'phases_ms': {phase: total * 1000 / max(steps, 1) for phase, total in totals.items()},
+        'peak_memory_bytes': peak_memory,
+        'entities_before': entities_before,
+        'entities_after': count_entities(sim),
+        'entities_per_step': entities_per_step,
+    }
+
+
+def print_result(result, baseline=None):
+    line = f"{result['name']:<16} {result['ticks_per_sec']:>9.1f} шаг/с  пик {result['peak_memory_bytes'] / 2**20:>7.1f} МБ"
+    if baseline:
+        line += f"  x{result['ticks_per_sec'] / baseline['ticks_per_sec']:.2f} к базовому"
+    print(line)
+    counts = [result['entities_before'], *result['entities_per_step']]
+    print(f"    мир {result['world'][0]}x{result['world'][1]}, люди по шагам: {' '.join(str(c['humans']) for c in counts)}, "
+          f"группы: {' '.join(str(c['groups']) for c in counts)}")
+    for phase, ms in result['phases_ms'].items():
+        extra = ''
+        if baseline and baseline['phases_ms'].get(phase):
+            extra = f"  (было {baseline['phases_ms'][phase]:.2f})"
+        print(f"    {phase:<12} {ms:>9.2f} мс/шаг{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности симуляции по фазам.")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="список сценариев через запятую")
+    parser.add_argument('--steps', type=int, default=20, help="шагов на сценарий")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="куда записать результаты (JSON)")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {r['name']: r for r in json.load(f)['results']}
+
+    results = []
+    for name in args.scenarios.split(','):
+        result = run_scenario(name, args.steps, args.seed)
+        print_result(result, baseline.get(name))
+        results.append(result)
+
+    if args.output:
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,3 @@
-import math
-
 # --- Константы и Настройки ---
 # Экран
 SCREEN_WIDTH = 1280
@@ -37,7 +35,31 @@ COLORS = {
 # Параметры Симуляции
 INITIAL_SPEED = 1
 TICK_STEP = 50
+SIM_STEP_RATE = 60 # шагов планировщика симуляции в секунду (не зависит от FPS)
+SIM_MAX_LAG = 0.25 # отставание в секундах, после которого планировщик не догоняет, а пропускает время
 MAX_RESOURCE_PER_TILE = 100000
+RESOURCE_TYPES = ['food', 'water', 'wood', 'stone']
+FOOD, WATER, WOOD, STONE = range(len(RESOURCE_TYPES)) # номера ресурсов в Resources
+RESOURCE_IDS = {**{res: i for i, res in enumerate(RESOURCE_TYPES)}, **{i: i for i in range(len(RESOURCE_TYPES))}}
+RESOURCE_INDEX_CELL = 10 # размер корзины индекса ресурсов в клетках
+GROUP_SEARCH_INDEX_RATIO = 8 # группа ищет ресурс по индексу, если кандидатов в столько раз меньше клеток обзора
+NEIGHBOR_RADII = (1, 2, 3) # радиусы территорий племени, города и государства
+TIMER_WHEEL_SLOTS = 256 # корзин в колесе таймеров мира (по одной на шаг)
+RESOURCE_REGROW_DELAY = 300 # шагов до восстановления опустевшей клетки
+RESOURCE_REGROW_AMOUNT = MAX_RESOURCE_PER_TILE // 10 # сколько ресурса появляется на восстановленной клетке
+RADIATION_DECAY_DELAY = 1000 # шагов до распада радиации на клетке
+PARALLEL_REGION_SIZE = 16 # сторона региона параллельного шага в клетках
+PATH_REGION_SIZE = 16 # сторона региона, для которого считается одно поле расстояний
+PATH_FIELD_MARGIN = 16 # насколько окно поля выходит за свой регион
+PATH_BORDER_COST = 3 # стоимость шага по земле государства
+PATH_RADIATION_COST = 10 # стоимость шага по зараженной клетке
+TELEMETRY_RING_SIZE = 600 # строк телеметрии в памяти для живых графиков
+TELEMETRY_FLUSH_ROWS = 256 # строк телеметрии в одной дозаписи файла
+LOD_REGION_SIZE = 32 # сторона региона упрощенной модели в клетках
+LOD_STEP_INTERVAL = 10 # упрощенная модель продвигается раз в столько шагов
+LOD_MIN_ACTIVE_STEPS = 100 # сколько шагов поднятый регион остается подробным
+LOD_GROUP_FORMATION_RATE = 0.05 # доля одиночек региона, уходящих в группы за шаг
+LOD_GROUP_MERGE_RATE = 0.1 # доля групп региона, сливающихся с другими за шаг
 
 HUMAN_LIFESPAN = (60, 90) # в секундах
 HUMAN_MAX_HUNGER = 10
@@ -46,9 +68,11 @@ HUMAN_INVENTORY_CAPACITY = 50
 HUMAN_MERGE_RADIUS = 5
 HUMAN_VISION_RADIUS = 10
 HUMAN_GATHER_SPEED = 3
+HUMAN_IDLE_GOALS = ['wood', 'stone', 'human'] # занятия сытого человека
 
 GROUP_CREATION_MEMBERS = 2
 GROUP_JOIN_RADIUS = 4
+SOCIAL_HASH_CELL = max(2, 3, GROUP_JOIN_RADIUS) # наибольший радиус в update_social_dynamics
 
 TRIBE_CREATION_POPULATION = 10
 TRIBE_CREATION_RESOURCES = {'wood': 50, 'stone': 50}
@@ -60,9 +84,3 @@ CITY_MAX_POPULATION = 1000
 STATE_CREATION_RESOURCES = {'wood': 10000, 'stone': 10000}
 STATE_EXPANSION_COST = {'wood': 2000, 'stone': 2000}
 MAX_TECHNOLOGY_LVL = 100
-
-
-# --- Вспомогательные функции ---
-def get_distance(pos1, pos2):
-    """Вычисляет расстояние между двумя точками."""
-    return math.sqrt((pos1[0] - pos2[0])**2 + (pos1[1] - pos2[1])**2)
\ No newline at end of file
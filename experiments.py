@@ -0,0 +1,120 @@
+"""Серии прогонов по сетке параметров на пуле процессов.
+
+Каждая комбинация параметров прогоняется с каждым зерном в отдельном процессе без окна.
+Параметры - имена констант config.py; процесс получает свои значения до первого импорта
+модулей симуляции, поэтому `from config import *` в них уже видит нужную конфигурацию.
+Константы, выведенные в config.py из заданных (GRID_WIDTH из TILE_SIZE и т.п.),
+пересчитываются по тем же выражениям.
+Процессы запускаются через spawn и живут ровно один прогон, чтобы значения одного
+прогона не доставались следующему. Итоги (метрики телеметрии на последнем шаге)
+дописываются в CSV по мере готовности:
+
+    python experiments.py --param HUMAN_VISION_RADIUS=5,10,20 \\
+        --param "STATE_EXPANSION_COST={'wood': 1000, 'stone': 1000},{'wood': 4000, 'stone': 4000}" \\
+        --seeds 1 2 3 --ticks 2000 --output sweep.csv
+"""
+import argparse
+import ast
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+import config
+
+# Модули симуляции здесь не импортируются: spawn заново исполняет этот файл в каждом
+# процессе, и ранний импорт зафиксировал бы в них значения config по умолчанию
+
+
+def parse_param(text):
+    """'NAME=v1,v2,...' -> (NAME, [v1, v2, ...]); значения - литералы Python."""
+    name, sep, values = text.partition('=')
+    if not sep or not hasattr(config, name):
+        raise argparse.ArgumentTypeError(f"неизвестный параметр config: {text}")
+    parsed = ast.literal_eval(f"[{values}]")
+    return name, parsed
+
+
+def expand_grid(params):
+    """Все сочетания значений: [(NAME, [значения]), ...] -> [{NAME: значение, ...}, ...]."""
+    names = [name for name, values in params]
+    return [dict(zip(names, combo)) for combo in itertools.product(*(values for name, values in params))]
+
+
+def apply_overrides(overrides):
+    """Подставляет значения в config и заново вычисляет константы, которые в config.py
+    выражены через них (по порядку файла, поэтому цепочки тоже пересчитываются)."""
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    with open(config.__file__, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    changed = set(overrides)
+    for node in tree.body:
+        if not isinstance(node, ast.Assign) or len(node.targets) != 1 or not isinstance(node.targets[0], ast.Name):
+            continue
+        name = node.targets[0].id
+        if name in overrides: continue # явно заданное значение важнее формулы
+        if changed & {n.id for n in ast.walk(node.value) if isinstance(n, ast.Name)}:
+            setattr(config, name, eval(compile(ast.Expression(node.value), config.__file__, 'eval'), vars(config)))
+            changed.add(name)
+
+
+def run_experiment(job):
+    """Один прогон в свежем процессе; возвращает словарь итогов (или ошибку)."""
+    overrides, seed, ticks, humans, width, height = job
+    apply_overrides(overrides)
+    result = {'seed': seed, **overrides}
+    try:
+        from simulation import Simulation
+        from telemetry import Telemetry, METRICS
+        sim = Simulation(width or config.GRID_WIDTH, height or config.GRID_HEIGHT, seed=seed)
+        sim.spawn_humans(humans)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            sim.update(config.TICK_STEP)
+        elapsed = time.perf_counter() - start
+        telemetry = Telemetry()
+        telemetry.steps = ticks
+        result.update(zip(METRICS, telemetry.collect(sim, elapsed / max(ticks, 1))))
+        result['elapsed_s'] = round(elapsed, 3)
+    except Exception:
+        result['error'] = traceback.format_exc(limit=3).strip().splitlines()[-1]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогоны симуляции по сетке параметров на всех ядрах.")
+    parser.add_argument('--param', type=parse_param, action='append', default=[],
+                        help="NAME=v1,v2,... - константа config.py и ее значения (можно несколько раз)")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0], help="зерна для каждой комбинации")
+    parser.add_argument('--ticks', type=int, default=1000, help="шагов в прогоне")
+    parser.add_argument('--humans', type=int, default=500, help="сколько людей расселить в начале")
+    parser.add_argument('--width', type=int, help="ширина мира в клетках (по умолчанию GRID_WIDTH)")
+    parser.add_argument('--height', type=int, help="высота мира в клетках (по умолчанию GRID_HEIGHT)")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="одновременных прогонов")
+    parser.add_argument('--output', default='experiments.csv', help="куда дописывать итоги (CSV)")
+    args = parser.parse_args()
+
+    from telemetry import METRICS
+    names = [name for name, values in args.param]
+    columns = [*names, 'seed', *METRICS, 'elapsed_s', 'error']
+    jobs = [(overrides, seed, args.ticks, args.humans, args.width, args.height)
+            for overrides in expand_grid(args.param) for seed in args.seeds]
+    print(f"Прогонов: {len(jobs)}, процессов: {args.processes}")
+
+    new_file = not os.path.exists(args.output) or os.path.getsize(args.output) == 0
+    context = multiprocessing.get_context('spawn')
+    with open(args.output, 'a', newline='', encoding='utf-8') as f, \
+            context.Pool(args.processes, maxtasksperchild=1) as pool:
+        writer = csv.DictWriter(f, columns)
+        if new_file: writer.writeheader()
+        for done, result in enumerate(pool.imap_unordered(run_experiment, jobs), 1):
+            writer.writerow({name: repr(result[name]) if name in names else result.get(name, '') for name in columns})
+            f.flush()
+            status = result.get('error') or f"государств {result['states']}, {result['elapsed_s']} с"
+            print(f"[{done}/{len(jobs)}] {', '.join(f'{n}={result[n]!r}' for n in names)} seed={result['seed']}: {status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,57 @@
 import pygame
-from world import World
 from config import *
 from settlement import *
 from human import Human, Group
 from tile import Tile
+from simulation import Simulation
+from runner import SimulationRunner
+from world import MapCanvas
 
 
 # --- Основной класс игры ---
 class Game:
-    def __init__(self):
+    """Окно pygame: отображает Simulation и передает ей ввод пользователя."""
+    def __init__(self, simulation=None):
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont("Arial", 12)
         self.big_font = pygame.font.SysFont("Arial", 16, bold=True)
-        self.world = World(GRID_WIDTH, GRID_HEIGHT)
-        self.humans = []
-        self.groups = []
-        self.settlements = []
-        self.states = []
+        self.mono_font = pygame.font.SysFont("Consolas,Courier New,monospace", 11)
+        self.sim = simulation or Simulation()
+        # Подробно идет то, что видно в окне; остальная карта - упрощенной моделью
+        if self.sim.lod: self.sim.lod.focus = (0, 0, GRID_WIDTH, GRID_HEIGHT)
+        # Симуляция идет в своем потоке, окно рисует последний опубликованный кадр
+        self.runner = SimulationRunner(self.sim)
+        self.canvas = None # карта, собранная из цветов клеток кадров
         self.running = True
-        self.paused = False
-        self.game_speed = 1
         self.selected_object = None
         self.spawning_mode = False
-        self.tick = 0
+        self.show_profiler = False
 
     def run(self):
-        while self.running:
-            self.handle_events()
-            if not self.paused:
-                for _ in range(self.game_speed):
-                    self.update()
-            self.draw()
-            self.clock.tick(60)
+        self.runner.start()
+        try:
+            while self.running:
+                self.handle_events()
+                self.draw()
+                self.clock.tick(60)
 
-            fps = self.clock.get_fps()
-            pygame.display.set_caption(f"Эволюция Цивилизации - FPS: {fps:.2f}")
+                fps = self.clock.get_fps()
+                pygame.display.set_caption(f"Эволюция Цивилизации - FPS: {fps:.2f}")
+        finally:
+            self.runner.stop()
         pygame.quit()
 
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT: self.running = False
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE: self.paused = not self.paused
-                if event.key == pygame.K_RIGHT: self.game_speed = min(self.game_speed * 2, 64)
-                if event.key == pygame.K_LEFT: self.game_speed = max(self.game_speed // 2, 1)
+                runner = self.runner
+                if event.key == pygame.K_SPACE: runner.paused = not runner.paused
+                if event.key == pygame.K_RIGHT: runner.speed = min(runner.speed * 2, 64)
+                if event.key == pygame.K_LEFT: runner.speed = max(runner.speed // 2, 1)
+                if event.key == pygame.K_p: self.show_profiler = not self.show_profiler
             
             if event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = pygame.mouse.get_pos()
@@ -55,141 +61,34 @@ class Game:
                 else: # Клик по миру
                     grid_x = mouse_pos[0] // TILE_SIZE
                     grid_y = mouse_pos[1] // TILE_SIZE
-                    if self.spawning_mode:
-                        self.add_human(grid_x, grid_y)
-                    else:
-                        self.selected_object = self.get_object_at(grid_x, grid_y)
+                    with self.runner.lock:
+                        if self.spawning_mode:
+                            self.sim.add_human(grid_x, grid_y)
+                        else:
+                            self.selected_object = self.get_object_at(grid_x, grid_y)
 
     def get_object_at(self, x, y):
         # В порядке "слоев": государства -> поселения -> группы -> люди -> тайлы
-        tile = self.world.get_tile(x,y)
+        world = self.sim.world
+        tile = world.get_tile(x,y)
         if tile and tile.owner_state: return tile.owner_state
-        for s in self.settlements:
-            if get_distance((x, y), s.get_pos()) <= 2: return s
-        for g in self.groups:
-            if get_distance((x, y), g.get_pos()) <= 1: return g
-        for h in self.humans:
-            if h.x == x and h.y == y: return h
-        return tile
-
-    def add_human(self, x, y):
-        self.humans.append(Human(x, y))
-    
-    def generate_state_color(self, existing_colors):
-        while True:
-            color = (random.randint(50, 255), random.randint(50, 255), random.randint(50, 255))
-            if all(sum(abs(c1 - c2) for c1, c2 in zip(color, ex)) > 120 for ex in existing_colors):
-                return color
-
-    def update(self):
-
-        self.tick += self.game_speed
-        if self.tick % TICK_STEP < self.game_speed:
-        
-            # Обновление всех сущностей
-            for human in self.humans: human.update(self.world, self.humans)
-            for group in self.groups: group.update(self.world, self.groups)
-            
-            for s in self.settlements:
-                if isinstance(s, State):
-                    s.update(self.world, self.states)
-                else: 
-                    s.update(self.world)
-                
-                    if hasattr(s, 'can_evolve') and s.can_evolve():
-                        if isinstance(s, City):
-                            color = self.generate_state_color([st.color for st in self.states])
-                            new_state = State(s, color)
-                            self.states.append(new_state)
-                            self.settlements.append(new_state)
-                            self.settlements.remove(s)
-                            new_state.update_territory(self.world); 
-                            new_state.update_border_tiles(self.world)
-                        elif isinstance(s, Tribe): 
-                            self.settlements.append(City(s))
-                            self.settlements.remove(s)
-
-            # Социальная динамика и эволюция
-            self.update_social_dynamics()
-            
-            # Очистка мертвых
-            self.humans = [h for h in self.humans if not h.is_dead()]
-            self.groups = [g for g in self.groups if g.population > 0]
-            self.settlements = [s for s in self.settlements if s.population > 0]
-            self.states = [s for s in self.states if s in self.settlements]
-
-
-    def update_social_dynamics(self):
-        # 1. Формирование групп из людей
-        to_remove_h, checked_h = [], set()
-        for h1 in self.humans:
-            if h1 in checked_h: continue
-            partners = [h1]
-            for h2 in self.humans:
-                if h1 != h2 and get_distance(h1.get_pos(), h2.get_pos()) < 2:
-                    partners.append(h2)
-            
-            if len(partners) >= GROUP_CREATION_MEMBERS:
-                avg_x = int(sum(p.x for p in partners) / len(partners))
-                avg_y = int(sum(p.y for p in partners) / len(partners))
-                self.groups.append(Group(avg_x, avg_y, partners))
-                for p in partners:
-                    to_remove_h.append(p)
-                    checked_h.add(p)
-        self.humans = [h for h in self.humans if h not in to_remove_h]
-
-        # 2. Присоединение людей к группам
-        to_remove_h = []
-        for human in self.humans:
-            for group in self.groups:
-                if get_distance(human.get_pos(), group.get_pos()) < GROUP_JOIN_RADIUS:
-                    group.population += 1
-                    for res, amount in human.resources.items(): group.resources[res] += amount
-                    to_remove_h.append(human)
-                    break
-        self.humans = [h for h in self.humans if h not in to_remove_h]
-
-        # 3. Взаимодействие групп
-        to_remove_g, checked_g = [], set()
-        for g1 in self.groups:
-            if g1 in checked_g: continue
-            for g2 in self.groups:
-                if g1 != g2 and g2 not in checked_g and get_distance(g1.get_pos(), g2.get_pos()) < 3:
-                    # Война или слияние
-                    if g1.get_strength() > g2.get_strength() * 1.5: # Война - сильный побеждает
-                        g1.population += g2.population * 0.5 # Поглощает половину
-                        for res, amount in g2.resources.items(): g1.resources[res] += amount
-                        to_remove_g.append(g2)
-                    elif g2.get_strength() > g1.get_strength() * 1.5:
-                        g2.population += g1.population * 0.5
-                        for res, amount in g1.resources.items(): g2.resources[res] += amount
-                        to_remove_g.append(g1)
-                    else: # Слияние
-                        g1.population += g2.population
-                        for res, amount in g2.resources.items(): g1.resources[res] += amount
-                        to_remove_g.append(g2)
-
-                    checked_g.add(g1); checked_g.add(g2)
-                    break
-        self.groups = [g for g in self.groups if g not in to_remove_g]
-
-
-        # 4. Эволюция групп в племена
-        to_remove_g = []
-        for group in self.groups:
-            if group.can_evolve():
-                self.settlements.append(Tribe(group))
-                to_remove_g.append(group)
-        self.groups = [g for g in self.groups if g not in to_remove_g]
+        occupancy = world.occupancy
+        humans = occupancy.at('humans', x, y)
+        return occupancy.first_within('settlements', x, y, 2) or occupancy.first_within('groups', x, y, 1) or \
+               (humans[0] if humans else tile)
 
     def draw(self):
         self.screen.fill(COLORS['background'])
         game_surface = self.screen.subsurface(pygame.Rect(0, 0, GAME_WORLD_WIDTH, SCREEN_HEIGHT))
-        self.world.draw(game_surface)
+        frame, colors = self.runner.take()
+        profiler = self.sim.profiler
+        with profiler.measure('draw_world'):
+            self.draw_world(game_surface, colors)
         
-        for s in self.settlements: s.draw(game_surface)
-        for g in self.groups: g.draw(game_surface, self.font)
-        for h in self.humans: h.draw(game_surface)
+        with profiler.measure('draw_entities'):
+            for cls, x, y in frame.settlements: cls.draw_at(game_surface, x, y)
+            for x, y, population in frame.groups: Group.draw_at(game_surface, self.font, x, y, population)
+            for x, y in frame.humans: Human.draw_at(game_surface, x, y)
         
         if self.spawning_mode:
             mouse_pos = pygame.mouse.get_pos()
@@ -200,24 +99,50 @@ class Game:
                 s.fill(COLORS['spawn_marker'])
                 game_surface.blit(s, marker_rect.topleft)
 
-        self.draw_ui()
+        # Счетчики берутся из кадра; живые объекты читает только панель выбранного объекта,
+        # поэтому шаг симуляции ждем лишь тогда, когда что-то выбрано
+        with profiler.measure('draw_ui'):
+            if self.selected_object:
+                with self.runner.lock: self.draw_ui(frame)
+            else:
+                self.draw_ui(frame)
+        if self.show_profiler: self.draw_profiler()
         pygame.display.flip()
 
-    def draw_ui(self):
+    def draw_world(self, surface, colors):
+        # Карта собирается из цветов клеток, пришедших с кадрами; первый кадр несет все клетки
+        if self.canvas is None: self.canvas = MapCanvas(self.sim.world.width, self.sim.world.height)
+        self.canvas.paint(colors)
+        self.canvas.draw(surface)
+
+    def draw_profiler(self):
+        # Оверлей внизу панели: среднее, p95 и максимум по фазам (клавиша P)
+        lines = self.sim.profiler.report_lines()
+        height = len(lines) * 14 + 10
+        overlay = pygame.Surface((UI_PANEL_WIDTH, height), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 200))
+        self.screen.blit(overlay, (GAME_WORLD_WIDTH, SCREEN_HEIGHT - height))
+        y = SCREEN_HEIGHT - height + 5
+        for line in lines:
+            self.draw_text(line, 10, y, font=self.mono_font)
+            y += 14
+
+    def draw_ui(self, frame):
+        runner = self.runner
         ui_rect = pygame.Rect(GAME_WORLD_WIDTH, 0, UI_PANEL_WIDTH, SCREEN_HEIGHT)
         pygame.draw.rect(self.screen, COLORS['ui_background'], ui_rect)
         y = 20
         
         # Общая инфо
-        self.draw_text(f"Симуляция: {'Пауза' if self.paused else 'Идет'}", 20, y)
+        self.draw_text(f"Симуляция: {'Пауза' if runner.paused else 'Идет'}", 20, y)
         y += 30
-        self.draw_text(f"Скорость: x{self.game_speed}", 20, y)
+        self.draw_text(f"Скорость: x{runner.speed}", 20, y)
         y += 30
-        self.draw_text(f"Год: x{self.tick // 50}", 20, y)
+        self.draw_text(f"Год: x{frame.tick // TICK_STEP}", 20, y)
         y += 30
-        self.draw_text(f"Люди: {len(self.humans)} | Группы: {len(self.groups)}", 20, y)
+        self.draw_text(f"Люди: {frame.humans_count} | Группы: {frame.groups_count}", 20, y)
         y += 25
-        self.draw_text(f"Поселения: {len([s for s in self.settlements if not isinstance(s, State)])} | Государства: {len(self.states)}", 20, y)
+        self.draw_text(f"Поселения: {frame.settlements_count} | Государства: {frame.states_count}", 20, y)
         y += 30
         
         # Кнопка
@@ -334,5 +259,6 @@ class Game:
         pygame.draw.rect(self.screen, COLORS['progress_bar_fill'], fill_rect, border_radius=3)
 
 
-game = Game()
-game.run()
+if __name__ == '__main__':
+    game = Game()
+    game.run()
@@ -0,0 +1,44 @@
+"""Целочисленная геометрия клеток без квадратных корней.
+
+Сравнения с радиусом делаются по квадрату расстояния (dist2(a, b) < r * r),
+а обходы окрестностей - по заранее посчитанным таблицам смещений для каждого радиуса."""
+from functools import lru_cache
+
+
+def dist2(pos1, pos2):
+    """Квадрат евклидова расстояния между клетками."""
+    dx, dy = pos1[0] - pos2[0], pos1[1] - pos2[1]
+    return dx * dx + dy * dy
+
+
+@lru_cache(maxsize=None)
+def square_offsets(radius):
+    """Смещения квадрата радиуса radius без центра, в порядке обхода dx, затем dy."""
+    return tuple((dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+                 if dx or dy)
+
+
+@lru_cache(maxsize=None)
+def disc_offsets(radius):
+    """Смещения круга dx^2 + dy^2 <= radius^2 (вместе с центром)."""
+    return tuple((dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+                 if dx * dx + dy * dy <= radius * radius)
+
+
+@lru_cache(maxsize=None)
+def distance_rings(radius):
+    """Смещения строго ближе radius по кольцам: ((d2, смещения), ...) по возрастанию d2."""
+    rings = {}
+    for dx in range(-radius, radius + 1):
+        for dy in range(-radius, radius + 1):
+            d2 = dx * dx + dy * dy
+            if d2 < radius * radius: rings.setdefault(d2, []).append((dx, dy))
+    return tuple((d2, tuple(rings[d2])) for d2 in sorted(rings))
+
+
+@lru_cache(maxsize=None)
+def box_offsets(lo, hi):
+    """Смещения квадрата range(lo, hi) x range(lo, hi) по возрастанию расстояния,
+    при равенстве - в порядке обхода dx, затем dy."""
+    return tuple(sorted(((dx, dy) for dx in range(lo, hi) for dy in range(lo, hi)),
+                        key=lambda d: (d[0] * d[0] + d[1] * d[1], d[0], d[1])))
@@ -2,105 +2,129 @@ import pygame
 from config import *
 import random
 from tile import Tile
+from resources import Resources
+from geometry import dist2, box_offsets
 
 
 
 class Human:
-    def __init__(self, x, y):
+    __slots__ = ('x', 'y', 'state', 'hunger', 'thirst', 'age', 'lifespan', 'resources', 'target', 'goal', 'active')
+
+    def __init__(self, x, y, rng=random):
         self.x, self.y = x, y
         self.state = "searching_partner"
         self.hunger = 0
         self.thirst = 0
         self.age = 0
-        self.lifespan = random.uniform(HUMAN_LIFESPAN[0], HUMAN_LIFESPAN[1])
-        self.resources = {'food': 5, 'water': 5, 'wood': 0, 'stone': 0}
+        self.lifespan = rng.uniform(HUMAN_LIFESPAN[0], HUMAN_LIFESPAN[1])
+        self.resources = Resources((5, 5, 0, 0))
         self.target = None
+        self.goal = None # цель, под которую найден self.target
+        self.active = True # False, когда человек ушел в группу
 
     def get_pos(self): return (self.x, self.y)
 
-    def draw(self, surface):
-        pos = (self.x * TILE_SIZE + TILE_SIZE // 2, self.y * TILE_SIZE + TILE_SIZE // 2)
+    def draw(self, surface): Human.draw_at(surface, self.x, self.y)
+
+    @staticmethod
+    def draw_at(surface, x, y):
+        # Рисование по одним координатам - так же рисуются кадры из SimulationRunner
+        pos = (x * TILE_SIZE + TILE_SIZE // 2, y * TILE_SIZE + TILE_SIZE // 2)
         pygame.draw.circle(surface, COLORS['human'], pos, TILE_SIZE // 2)
 
-    def update(self, world, humans):
+    def live(self):
+        """Возраст, нужды и еда из запасов за ход; False, если человек умер."""
         self.age += 1
         self.hunger += 0.4
         self.thirst += 0.6
         if self.is_dead():
-            return
+            return False
         self.consume_resources()
-        self.run_ai(world, humans)
+        return True
     
     def is_dead(self):
         return self.hunger >= 10 or self.thirst >= 10 or self.age >= self.lifespan
 
     def consume_resources(self):
-        if self.hunger > 5 and self.resources['food'] > 0:
-            self.resources['food'] -= 1; self.hunger -= 3
-        if self.thirst > 6 and self.resources['water'] > 0:
-            self.resources['water'] -= 1; self.thirst -= 4
-
-    def run_ai(self, world, humans):
-        if self.thirst > 5: self.target = self.find_nearest_resource(world, 'water')
-        elif self.hunger > 5: self.target = self.find_nearest_resource(world, 'food')
+        if self.hunger > 5 and self.resources[FOOD] > 0:
+            self.resources[FOOD] -= 1; self.hunger -= 3
+        if self.thirst > 6 and self.resources[WATER] > 0:
+            self.resources[WATER] -= 1; self.thirst -= 4
+
+    @staticmethod
+    def need_goal(hunger, thirst, carried):
+        """Цель по потребностям; None - человек свободен и сам выбирает занятие."""
+        if thirst > 5: return 'water'
+        if hunger > 5: return 'food'
+        if carried < HUMAN_INVENTORY_CAPACITY: return None
+        return 'human'
+
+    def choose_goal(self, rng, need, valid):
+        if need is not None: return need
+        # Свободная цель не перевыбирается, пока найденная под нее цель жива
+        if self.goal in HUMAN_IDLE_GOALS and valid: return self.goal
+        return rng.choice(HUMAN_IDLE_GOALS)
+
+    def has_valid_target(self, world, dead=None):
+        """Жива ли цель; dead(human) - умер ли человек-цель, по умолчанию его is_dead."""
+        target = self.target
+        if target is None: return False
+        if isinstance(target, Tile): return world.resource_amounts[target.index] > 0
+        return target.active and not (dead(target) if dead else target.is_dead())
+
+    def decide(self, world, x, y, need, dead=None):
+        """Выбор цели из клетки (x, y). Ход решается по миру и людям, какими они были
+        в начале хода, поэтому так же решают и Simulation, и HumanPopulation.
+        Возвращает True, если нужен ближайший человек: его ищет вызывающий."""
+        # Сначала выбираем цель, потом ищем только то, что для нее нужно
+        valid = self.has_valid_target(world, dead)
+        goal = self.choose_goal(world.rng, need, valid)
+        if goal == self.goal and valid: return False
+        self.goal = goal
+        if goal == 'human': return True
+        self.target = world.find_nearest_resource(x, y, goal, HUMAN_VISION_RADIUS)
+        return False
+
+    def approach(self, world, x, y):
+        """Путь к цели из клетки (x, y) и сбор на месте; клетка, к которой нужно шагнуть, или None."""
+        target = self.target
+        if target is None: return None
+        if isinstance(target, Tile):
+            target_pos = (target.x, target.y)
+            if world.paths: self.target, target_pos = world.paths.route(x, y, target)
         else:
-            if sum([self.resources[i] for i in self.resources]) < HUMAN_INVENTORY_CAPACITY:
-                    self.target = random.choice([self.find_nearest_resource(world, "wood"), self.find_nearest_resource(world, "stone"), self.find_nearest_human(humans)])
-            else:
-                self.target = self.find_nearest_human(humans)
-
-        if self.target:
-            target_pos = self.target.get_pos() if isinstance(self.target, Human) else (self.target.x, self.target.y)
-            if get_distance(self.get_pos(), target_pos) == 0:
-                if isinstance(self.target, Tile):
-                    self.gather_resource(self.target)
-                    self.target = None
-            else:
-                self.move_towards(target_pos)
+            target_pos = target.get_pos()
+        if target_pos != (x, y): return target_pos
+        if isinstance(self.target, Tile):
+            self.gather_resource(self.target)
+            self.target = None
+        return None
     
     def gather_resource(self, tile):
         if tile and tile.resource_amount > 0:
-            self.resources[tile.resource_type] += HUMAN_GATHER_SPEED
+            self.resources[tile.resource_code] += HUMAN_GATHER_SPEED
             tile.resource_amount -= HUMAN_GATHER_SPEED
 
     def move_towards(self, target_pos):
         dx, dy = target_pos[0] - self.x, target_pos[1] - self.y
         if abs(dx) > abs(dy): self.x += 1 if dx > 0 else -1
         elif dy != 0: self.y += 1 if dy > 0 else -1
-        
-        self.x = max(0, min(GRID_WIDTH - 1, self.x))
-        self.y = max(0, min(GRID_HEIGHT - 1, self.y))
+        # Цель всегда клетка мира, поэтому шаг к ней не выводит за границы
 
 
-    def find_nearest_resource(self, world, resource_type):
-        return self.find_nearest(world.grid, lambda tile: tile.resource_type == resource_type and tile.resource_amount > 0)
-    
-    def find_nearest_human(self, humans):
-        return self.find_nearest(humans, lambda h: h != self)
-        
-    def find_nearest(self, collection, condition):
-        best_obj, min_dist = None, float('inf')
-        # Ограничиваем поиск радиусом, чтобы не сканировать всю карту
-        search_radius = HUMAN_VISION_RADIUS
-        
-        # Проверяем объекты в коллекции (либо тайлы, либо люди)
-        flat_collection = [item for sublist in collection for item in sublist] if isinstance(collection[0], list) else collection
-
-        for obj in flat_collection:
-            if condition(obj):
-                dist = get_distance(self.get_pos(), obj.get_pos() if hasattr(obj, 'get_pos') else (obj.x, obj.y))
-                if dist < min_dist and dist < search_radius:
-                    min_dist = dist
-                    best_obj = obj
-        return best_obj
+    def find_nearest_human(self, world):
+        # Ближайший по кольцам вокруг себя через индекс занятости вместо обхода всех людей
+        return world.occupancy.nearest('humans', self.x, self.y, HUMAN_VISION_RADIUS, exclude=self)
 
 
 
 class Group:
+    __slots__ = ('x', 'y', 'population', 'resources', 'inventory_capacity', 'state', 'target', 'reproduction_progress')
+
     def __init__(self, x, y, initial_members):
         self.x, self.y = x, y
         self.population = len(initial_members)
-        self.resources = {res: sum(h.resources.get(res, 0) for h in initial_members) for res in ['food', 'water', 'wood', 'stone']}
+        self.resources = Resources(sum(h.resources[i] for h in initial_members) for i in range(len(RESOURCE_TYPES)))
         self.inventory_capacity = self.population * 20
         self.state = "searching_resource"
         self.target = None
@@ -108,12 +132,15 @@ class Group:
 
     def get_pos(self): return (self.x, self.y)
     
-    def get_strength(self): return self.population + sum(self.resources.values())/10
+    def get_strength(self): return self.population + sum(self.resources)/10
+
+    def draw(self, surface, font): Group.draw_at(surface, font, self.x, self.y, self.population)
 
-    def draw(self, surface, font):
-        pos = (self.x * TILE_SIZE + TILE_SIZE // 2, self.y * TILE_SIZE + TILE_SIZE // 2)
+    @staticmethod
+    def draw_at(surface, font, x, y, population):
+        pos = (x * TILE_SIZE + TILE_SIZE // 2, y * TILE_SIZE + TILE_SIZE // 2)
         pygame.draw.circle(surface, COLORS['group'], pos, TILE_SIZE * 0.8)
-        text = font.render(str(int(self.population)), True, (255,255,255))
+        text = font.render(str(int(population)), True, (255,255,255))
         text_rect = text.get_rect(center=pos)
         surface.blit(text, text_rect)
 
@@ -126,15 +153,16 @@ class Group:
         food_needed = self.population * 0.1
         water_needed = self.population * 0.15
 
-        if self.resources['food'] < food_needed or self.resources['water'] < water_needed:
+        resources = self.resources
+        if resources[FOOD] < food_needed or resources[WATER] < water_needed:
             self.population -= 1
             return
         
 
-        self.resources['food'] -= food_needed
-        self.resources['water'] -= water_needed
+        resources[FOOD] -= food_needed
+        resources[WATER] -= water_needed
 
-        if self.resources['food'] > self.population and self.resources['water'] > self.population:
+        if resources[FOOD] > self.population and resources[WATER] > self.population:
             self.population += 1
             self.inventory_capacity = self.population * 50
 
@@ -157,7 +185,9 @@ class Group:
                 return
 
             target_pos = self.target.get_pos() if hasattr(self.target, 'get_pos') else (self.target.x, self.target.y)
-            if get_distance(self.get_pos(), target_pos) == 0:
+            if world.paths and isinstance(self.target, Tile):
+                self.target, target_pos = world.paths.route(self.x, self.y, self.target)
+            if self.get_pos() == target_pos:
                 if isinstance(self.target, Tile):
                     self.state = "gathering"
                 elif isinstance(self.target, Group):
@@ -170,23 +200,23 @@ class Group:
 
     def find_best_target(self, world, groups):
         # Приоритеты: вода -> еда -> враг -> ресурсы для племени
-        if self.resources['water'] < self.population * 2: return self.find_nearest_resource(world, 'water')
-        if self.resources['food'] < self.population * 2: return self.find_nearest_resource(world, 'food')
+        if self.resources[WATER] < self.population * 2: return self.find_nearest_resource(world, 'water')
+        if self.resources[FOOD] < self.population * 2: return self.find_nearest_resource(world, 'food')
         
         nearest_group = self.find_nearest_group(groups)
-        if nearest_group and get_distance(self.get_pos(), nearest_group.get_pos()) < HUMAN_VISION_RADIUS * 2:
+        if nearest_group and dist2(self.get_pos(), nearest_group.get_pos()) < (HUMAN_VISION_RADIUS * 2)**2:
              return nearest_group
 
-        if self.resources['wood'] < TRIBE_CREATION_RESOURCES['wood']: return self.find_nearest_resource(world, 'wood')
-        if self.resources['stone'] < TRIBE_CREATION_RESOURCES['stone']: return self.find_nearest_resource(world, 'stone')
+        if self.resources[WOOD] < TRIBE_CREATION_RESOURCES['wood']: return self.find_nearest_resource(world, 'wood')
+        if self.resources[STONE] < TRIBE_CREATION_RESOURCES['stone']: return self.find_nearest_resource(world, 'stone')
         
-        return self.find_nearest_resource(world, random.choice(['wood', 'stone']))
+        return self.find_nearest_resource(world, world.rng.choice(['wood', 'stone']))
 
     def gather_resource(self, tile):
-        if sum(self.resources.values()) >= self.inventory_capacity: return
+        if sum(self.resources) >= self.inventory_capacity: return
         
         amount = min(self.population * HUMAN_GATHER_SPEED, tile.resource_amount)
-        self.resources[tile.resource_type] += amount
+        self.resources[tile.resource_code] += amount
         tile.resource_amount -= amount
 
         self.state = "searching_resource"
@@ -196,31 +226,41 @@ class Group:
         dx, dy = target_pos[0] - self.x, target_pos[1] - self.y
         if abs(dx) > abs(dy): self.x += 1 if dx > 0 else -1
         elif dy != 0: self.y += 1 if dy > 0 else -1
-        self.x = int(max(0, min(GRID_WIDTH - 1, self.x)))
-        self.y = int(max(0, min(GRID_HEIGHT - 1, self.y)))
     
     def find_nearest_resource(self, world, r_type):
-        # Простая реализация поиска в радиусе
-        best_tile, min_dist = None, float('inf')
-        for dx in range(-HUMAN_VISION_RADIUS, HUMAN_VISION_RADIUS):
-            for dy in range(-HUMAN_VISION_RADIUS, HUMAN_VISION_RADIUS):
-                tile = world.get_tile(self.x + dx, self.y + dy)
-                if tile and tile.resource_type == r_type and tile.resource_amount > 50:
-                    dist = get_distance(self.get_pos(), (tile.x, tile.y))
-                    if dist < min_dist:
-                        min_dist, best_tile = dist, tile
-        return best_tile
+        """Ближайшая клетка типа r_type с ресурсом больше 50 в квадрате range(-R, R) вокруг группы.
+        При равных расстояниях - клетка с меньшими dx, затем dy."""
+        code, x, y, R = RESOURCE_IDS[r_type], self.x, self.y, HUMAN_VISION_RADIUS
+        codes, amounts, width, height = world.resource_codes, world.resource_amounts, world.width, world.height
+        offsets = box_offsets(-R, R)
+        # Если индекс знает, что ресурса рядом мало, проверяем только непустые клетки квадрата
+        count = world.resource_count(code, x - R, y - R, x + R, y + R)
+        if count is not None and count < len(offsets) // GROUP_SEARCH_INDEX_RATIO:
+            best_key = None
+            for i in world.resource_tiles(code, x - R, y - R, x + R, y + R):
+                dx, dy = i // height - x, i % height - y
+                if amounts[i] > 50:
+                    key = (dx * dx + dy * dy, dx, dy)
+                    if best_key is None or key < best_key: best_key = key
+            return world.get_tile(x + best_key[1], y + best_key[2]) if best_key else None
+        # Иначе обходим квадрат кольцами и останавливаемся на первой подходящей клетке
+        for dx, dy in offsets:
+            tx, ty = x + dx, y + dy
+            if 0 <= tx < width and 0 <= ty < height:
+                i = tx * height + ty
+                if codes[i] == code and amounts[i] > 50: return world.get_tile(tx, ty)
+        return None
     
     def find_nearest_group(self, groups):
         best_group, min_dist = None, float('inf')
         for g in groups:
             if g == self: continue
-            dist = get_distance(self.get_pos(), g.get_pos())
+            dist = dist2(self.get_pos(), g.get_pos())
             if dist < min_dist:
                 min_dist, best_group = dist, g
         return best_group
     
     def can_evolve(self):
         return self.population >= TRIBE_CREATION_POPULATION and \
-               self.resources['wood'] >= TRIBE_CREATION_RESOURCES['wood'] and \
-               self.resources['stone'] >= TRIBE_CREATION_RESOURCES['stone']
+               self.resources[WOOD] >= TRIBE_CREATION_RESOURCES['wood'] and \
+               self.resources[STONE] >= TRIBE_CREATION_RESOURCES['stone']
@@ -0,0 +1,166 @@
+"""Уровни детализации: подробная симуляция только там, где на нее смотрят или что-то происходит.
+
+Карта делится на регионы по LOD_REGION_SIZE клеток. Регион подробный, если он попадает
+в область просмотра (focus), в нем есть поселение или государственная земля, либо его
+недавно подняли. Люди и группы остальных регионов сворачиваются в RegionAggregate -
+численность и общий запас ресурсов, - который раз в LOD_STEP_INTERVAL шагов продвигается
+сразу на весь интервал: люди доживают и собираются в группы, группы сливаются, собирают ресурсы с
+клеток региона, едят и растут. Когда средняя группа свернутого региона дорастает до племени
+(население и ресурсы на TRIBE_CREATION_*) или на него смотрят, он разворачивается обратно в сущности."""
+import numpy as np
+from config import *
+from human import Group
+from resources import Resources
+from world import TILE_DEPLETED
+
+
+class RegionAggregate:
+    """Свернутый регион: одиночки, группы (число и общее население) и их общие запасы."""
+    __slots__ = ('humans', 'groups', 'population', 'resources')
+
+    def __init__(self, humans=0, groups=0, population=0, resources=None):
+        self.humans, self.groups, self.population = humans, groups, population
+        self.resources = resources or Resources()
+
+    def ready_to_settle(self):
+        """Средняя группа региона доросла бы до племени."""
+        if self.groups < 1: return False
+        return self.population / self.groups >= TRIBE_CREATION_POPULATION and \
+               all(self.resources[RESOURCE_IDS[res]] / self.groups >= cost for res, cost in TRIBE_CREATION_RESOURCES.items())
+
+
+class LevelOfDetail:
+    def __init__(self, sim, focus=None):
+        """focus - область просмотра (x0, y0, x1, y1) в клетках или None."""
+        self.sim = sim
+        self.focus = focus
+        self.aggregates = {} # регион -> RegionAggregate
+        self.active_until = {} # регион -> шаг, до которого он остается подробным
+        self.steps = 0
+        world = sim.world
+        self.regions_x = -(-world.width // LOD_REGION_SIZE)
+        self.regions_y = -(-world.height // LOD_REGION_SIZE)
+
+    def region_of(self, x, y): return (x // LOD_REGION_SIZE, y // LOD_REGION_SIZE)
+
+    def region_indices(self, key):
+        """Индексы клеток региона в массивах World."""
+        world = self.sim.world
+        rx, ry = key
+        xs = np.arange(rx * LOD_REGION_SIZE, min((rx + 1) * LOD_REGION_SIZE, world.width))
+        ys = np.arange(ry * LOD_REGION_SIZE, min((ry + 1) * LOD_REGION_SIZE, world.height))
+        return (xs[:, None] * world.height + ys[None, :]).ravel()
+
+    def relevant_regions(self):
+        """Регионы, которые должны идти подробно в этом шаге."""
+        sim, world = self.sim, self.sim.world
+        relevant = {key for key, until in self.active_until.items() if until > self.steps}
+        for s in sim.settlements: relevant.add(self.region_of(s.x, s.y))
+        # Государственная земля: любой ненулевой владелец в блоке региона
+        size = LOD_REGION_SIZE
+        owners = np.frombuffer(world.owner_ids, dtype=np.int32).reshape(world.width, world.height)
+        for rx, ry in zip(*np.nonzero(np.add.reduceat(np.add.reduceat(
+                owners != 0, np.arange(0, world.width, size), axis=0), np.arange(0, world.height, size), axis=1))):
+            relevant.add((int(rx), int(ry)))
+        if self.focus:
+            x0, y0, x1, y1 = self.focus
+            for rx in range(max(0, x0 // size), min(self.regions_x, -(-x1 // size))):
+                for ry in range(max(0, y0 // size), min(self.regions_y, -(-y1 // size))):
+                    relevant.add((rx, ry))
+        for key, agg in self.aggregates.items():
+            if agg.ready_to_settle(): relevant.add(key)
+        return relevant
+
+    def update(self):
+        self.steps += 1
+        relevant = self.relevant_regions()
+        for key in sorted(k for k in self.aggregates if k in relevant):
+            self.promote(key)
+        self.demote(relevant)
+        if self.steps % LOD_STEP_INTERVAL == 0:
+            for key in sorted(self.aggregates):
+                self.advance(key, self.aggregates[key], LOD_STEP_INTERVAL)
+
+    def demote(self, relevant):
+        """Сворачивает людей и группы вне подробных регионов."""
+        sim = self.sim
+        keep_humans, keep_groups = [], []
+        for human in sim.humans:
+            key = self.region_of(human.x, human.y)
+            if key in relevant:
+                keep_humans.append(human)
+                continue
+            agg = self.aggregates.setdefault(key, RegionAggregate())
+            agg.humans += 1
+            for i, amount in enumerate(human.resources): agg.resources[i] += amount
+            human.active = False
+        for group in sim.groups:
+            key = self.region_of(group.x, group.y)
+            if key in relevant:
+                keep_groups.append(group)
+                continue
+            agg = self.aggregates.setdefault(key, RegionAggregate())
+            agg.groups += 1
+            agg.population += group.population
+            for i, amount in enumerate(group.resources): agg.resources[i] += amount
+        sim.humans, sim.groups = keep_humans, keep_groups
+
+    def promote(self, key):
+        """Разворачивает регион обратно в людей и группы в случайных клетках региона."""
+        sim, world = self.sim, self.sim.world
+        agg = self.aggregates.pop(key)
+        self.active_until[key] = self.steps + LOD_MIN_ACTIVE_STEPS
+        rx, ry = key
+        x0, y0 = rx * LOD_REGION_SIZE, ry * LOD_REGION_SIZE
+        x1, y1 = min(x0 + LOD_REGION_SIZE, world.width), min(y0 + LOD_REGION_SIZE, world.height)
+        for _ in range(round(agg.humans)):
+            sim.add_human(sim.rng.randrange(x0, x1), sim.rng.randrange(y0, y1))
+        count = min(max(1, round(agg.groups)), int(agg.population)) if agg.population >= 1 else 0
+        for _ in range(count):
+            group = Group(sim.rng.randrange(x0, x1), sim.rng.randrange(y0, y1), [])
+            group.population = agg.population / count
+            group.inventory_capacity = group.population * 20
+            group.resources = Resources(amount / count for amount in agg.resources)
+            sim.groups.append(group)
+
+    def advance(self, key, agg, steps):
+        """Продвигает свернутый регион сразу на steps шагов."""
+        # Одиночки доживают свой век и находят друг друга
+        if agg.humans:
+            died = agg.humans * min(1, steps * 2 / (HUMAN_LIFESPAN[0] + HUMAN_LIFESPAN[1]))
+            formed = (agg.humans - died) * min(1, steps * LOD_GROUP_FORMATION_RATE)
+            agg.humans -= died + formed
+            agg.population += formed
+            agg.groups += formed / GROUP_CREATION_MEMBERS
+            if agg.humans < 0.5: agg.humans = 0
+        # Группы региона рано или поздно встречаются и сливаются
+        if agg.groups > 1:
+            agg.groups = max(1, agg.groups * (1 - min(1, steps * LOD_GROUP_MERGE_RATE)))
+        if agg.population <= 0:
+            agg.population = agg.groups = 0
+            return
+
+        # Группы собирают ресурс поровну со всех непустых клеток региона
+        world = self.sim.world
+        idx = self.region_indices(key)
+        amounts = world.amounts_view[idx]
+        full = amounts > 0
+        if full.any():
+            idx, amounts = idx[full], amounts[full]
+            taken = np.minimum(amounts, agg.population * HUMAN_GATHER_SPEED * steps / len(idx))
+            left = amounts - taken
+            world.amounts_view[idx] = left
+            for i in idx[left <= 0].tolist(): world.emit(TILE_DEPLETED, i)
+            gained = np.bincount(world.codes_view[idx], weights=taken, minlength=len(RESOURCE_TYPES))
+            for res_id, amount in enumerate(gained.tolist()): agg.resources[res_id] += amount
+
+        # Еда и вода как в Group.consume_and_reproduce, но за все шаги разом
+        food_needed, water_needed = agg.population * 0.1 * steps, agg.population * 0.15 * steps
+        fed = min(1, agg.resources[FOOD] / food_needed, agg.resources[WATER] / water_needed)
+        agg.resources[FOOD] -= food_needed * fed
+        agg.resources[WATER] -= water_needed * fed
+        if fed < 1:
+            agg.population = max(0, agg.population - agg.groups * steps * (1 - fed))
+        elif agg.resources[FOOD] > agg.population and agg.resources[WATER] > agg.population:
+            agg.population += agg.groups * steps
+        agg.groups = min(agg.groups, agg.population)
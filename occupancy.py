@@ -0,0 +1,67 @@
+from geometry import distance_rings
+
+LAYERS = ('humans', 'groups', 'settlements')
+
+
+class Occupancy:
+    """Кто стоит на клетке: слой -> {(x, y): [(порядок, сущность), ...]}.
+
+    Порядок - место сущности в списке симуляции, поэтому при равенстве
+    выбирается та же сущность, что и при обходе списка. Полностью пересобирается
+    в конце шага (remove_dead); между пересборками люди переставляются при каждом шаге."""
+    def __init__(self):
+        self.layers = {layer: {} for layer in LAYERS}
+        self.next_order = dict.fromkeys(LAYERS, 0)
+
+    def rebuild(self, sim):
+        for layer in LAYERS:
+            cells = self.layers[layer] = {}
+            entities = getattr(sim, layer)
+            # В пакетном режиме координаты людей берутся из столбцов разом, а не из каждой строки
+            if layer == 'humans' and sim.population: positions = sim.population.positions(entities)
+            else: positions = [(entity.x, entity.y) for entity in entities]
+            for order, (entity, pos) in enumerate(zip(entities, positions)):
+                cells.setdefault(pos, []).append((order, entity))
+            self.next_order[layer] = len(entities)
+
+    def add(self, layer, entity):
+        order = self.next_order[layer]
+        self.next_order[layer] += 1
+        self.layers[layer].setdefault((entity.x, entity.y), []).append((order, entity))
+
+    def move(self, layer, entity, old_pos):
+        cells = self.layers[layer]
+        cell = cells.get(old_pos)
+        if not cell: return
+        for k, (order, e) in enumerate(cell):
+            if e is entity:
+                del cell[k]
+                if not cell: del cells[old_pos]
+                cells.setdefault((entity.x, entity.y), []).append((order, entity))
+                return
+
+    def at(self, layer, x, y):
+        """Сущности слоя на клетке (x, y) в порядке списка."""
+        return [e for order, e in sorted(self.layers[layer].get((x, y), ()), key=lambda item: item[0])]
+
+    def first_within(self, layer, x, y, radius):
+        """Первая по списку сущность на расстоянии не больше radius."""
+        cells = self.layers[layer]
+        best = None
+        for d2, ring in distance_rings(radius + 1):
+            if d2 > radius * radius: break
+            for dx, dy in ring:
+                for item in cells.get((x + dx, y + dy), ()):
+                    if best is None or item[0] < best[0]: best = item
+        return best[1] if best else None
+
+    def nearest(self, layer, x, y, radius, exclude=None):
+        """Ближайшая сущность строго ближе radius (при равенстве - первая по списку), кроме exclude."""
+        cells = self.layers[layer]
+        for d2, ring in distance_rings(radius):
+            best = None
+            for dx, dy in ring:
+                for item in cells.get((x + dx, y + dy), ()):
+                    if item[1] is not exclude and (best is None or item[0] < best[0]): best = item
+            if best: return best[1]
+        return None
@@ -0,0 +1,303 @@
+"""Параллельный шаг групп и поселений (кроме государств) на пуле процессов.
+
+Карта делится на квадратные регионы по PARALLEL_REGION_SIZE клеток. Каждый регион
+обновляется в отдельной задаче: процесс копирует из общей памяти запасы ресурсов на начало
+фазы - только окно региона с запасом на радиус обзора, - прогоняет свои группы и
+племена/города и возвращает их новое состояние вместе с тем, сколько каждый взял с каждой
+клетки. Координаты всех групп публикуются в общей памяти один раз за шаг, а процесс
+достает из них только группы в пределах HUMAN_VISION_RADIUS * 2 от региона - дальше
+find_best_target чужую группу целью не выбирает.
+
+Слияние идет по порядку регионов, а внутри - в порядке списков симуляции. Если две
+сущности из разных регионов опустошили одну клетку, первая по порядку получает все,
+что ей нужно, а следующим достается остаток - недостачу они возвращают из запасов.
+Государства (войны, расширение, дипломатия) связывают всю карту и обновляются
+последовательно в основном процессе, как и раньше.
+
+При включенных полях расстояний (Simulation.use_paths) каждый процесс держит свой кэш полей
+и, копируя окно, сбрасывает в нем поля там, где клетки окна изменились с прошлого раза."""
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from config import *
+from world import World
+from human import Group
+from settlement import Tribe, City, State
+from territory import Territory
+from pathfinding import FlowFields
+
+SETTLEMENT_KINDS = {'Tribe': Tribe, 'City': City}
+
+# Цель группы в задаче: нет, клетка (индекс клетки), другая группа (номер в sim.groups)
+TARGET_NONE, TARGET_TILE, TARGET_GROUP = 0, 1, 2
+
+_worker = {} # мир процесса-исполнителя и его общая память
+
+
+def _share(source, fmt):
+    """Копирует массив в новый блок общей памяти; возвращает (блок, представление)."""
+    nbytes = len(source) * source.itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+    view = shm.buf[:nbytes].cast(fmt)
+    view[:] = memoryview(source).cast('B').cast(fmt)
+    return shm, view
+
+
+def _init_worker(codes_name, amounts_name, owners_name, radioactive_name, width, height):
+    size = width * height
+    codes_shm = shared_memory.SharedMemory(name=codes_name)
+    amounts_shm = shared_memory.SharedMemory(name=amounts_name)
+    owners_shm = shared_memory.SharedMemory(name=owners_name)
+    radioactive_shm = shared_memory.SharedMemory(name=radioactive_name)
+    shared_amounts = np.frombuffer(amounts_shm.buf, dtype=np.float64, count=size)
+    # Запасы процесс меняет только в своей копии, общая память для него только для чтения
+    amounts = array('d', shared_amounts.tobytes())
+    world = World(width, height, random.Random(), arrays=(
+        codes_shm.buf[:size].cast('B'), amounts, owners_shm.buf[:4 * size].cast('i'), radioactive_shm.buf[:size].cast('B')))
+    # Копия карты живет одну задачу: события (индекс, таймеры) ведет только основной мир
+    world.listeners = [[] for _ in world.listeners]
+    world.resource_index = None # без подписки индекс устарел бы после первой задачи
+    _worker.update(world=world, shared_amounts=shared_amounts, shm=(codes_shm, amounts_shm, owners_shm, radioactive_shm))
+
+
+def _window(world, rx, ry, margin):
+    """Клетки региона (rx, ry) с запасом margin: срезы по x и y."""
+    x0, y0 = rx * PARALLEL_REGION_SIZE, ry * PARALLEL_REGION_SIZE
+    return (slice(max(x0 - margin, 0), min(x0 + PARALLEL_REGION_SIZE + margin, world.width)),
+            slice(max(y0 - margin, 0), min(y0 + PARALLEL_REGION_SIZE + margin, world.height)))
+
+
+def _changed_indices(world, window, changed):
+    xs, ys = np.nonzero(changed)
+    return ((xs + window[0].start) * world.height + ys + window[1].start).tolist()
+
+
+def _load_window(world, window, paths):
+    """Копирует запасы окна из общей памяти; при полях расстояний сбрасывает поля изменившихся клеток окна."""
+    shape = (world.width, world.height)
+    private = world.amounts_view.reshape(shape)[window]
+    shared = _worker['shared_amounts'].reshape(shape)[window]
+    if paths and world.paths is None:
+        world.paths = FlowFields(world)
+        # Владельцы и радиация, по которым считались поля процесса
+        _worker['owners_seen'] = np.frombuffer(world.owner_ids, dtype=np.int32).reshape(shape).copy()
+        _worker['radioactive_seen'] = np.frombuffer(world.radioactive, dtype=np.uint8).reshape(shape).copy()
+    elif paths:
+        for i in _changed_indices(world, window, (private > 0) != (shared > 0)):
+            world.paths.source_changed(i)
+        owners = np.frombuffer(world.owner_ids, dtype=np.int32).reshape(shape)[window]
+        radioactive = np.frombuffer(world.radioactive, dtype=np.uint8).reshape(shape)[window]
+        owners_seen, radioactive_seen = _worker['owners_seen'][window], _worker['radioactive_seen'][window]
+        for i in _changed_indices(world, window, (owners != owners_seen) | (radioactive != radioactive_seen)):
+            world.paths.cost_changed(i)
+        owners_seen[:] = owners
+        radioactive_seen[:] = radioactive
+    elif world.paths is not None:
+        world.paths = None
+    private[:] = shared
+
+
+def _load_groups(name, count, window):
+    """Строки таблицы групп из общей памяти, попадающие в окно: [(строка, x, y), ...] по порядку."""
+    shm = _worker.get('positions')
+    if shm is None or shm.name != name:
+        if shm: shm.close()
+        shm = _worker['positions'] = shared_memory.SharedMemory(name=name)
+    positions = np.ndarray((count, 2), dtype=np.int64, buffer=shm.buf)
+    xs, ys = positions[:, 0], positions[:, 1]
+    rows = np.flatnonzero((xs >= window[0].start) & (xs < window[0].stop) & (ys >= window[1].start) & (ys < window[1].stop))
+    result = list(zip(rows.tolist(), xs[rows].tolist(), ys[rows].tolist()))
+    del positions, xs, ys # представления держат буфер и не дали бы закрыть блок
+    return result
+
+
+def _update_region(task):
+    """Обновляет группы и поселения одного региона по копии карты на начало фазы."""
+    seed, paths, (rx, ry), positions_name, count, alive_count, target_rows, group_rows, settlement_rows = task
+    world = _worker['world']
+    # Группы и поселения региона не заглядывают дальше радиуса обзора от него,
+    # а поле расстояний - дальше своего окна вокруг региона полей
+    margin = HUMAN_VISION_RADIUS + 1
+    if paths: margin = max(margin, PATH_REGION_SIZE + PATH_FIELD_MARGIN)
+    _load_window(world, _window(world, rx, ry, margin), paths)
+    world.rng = random.Random(seed)
+    amounts = world.amounts_view
+
+    # Нужны соседи ближе HUMAN_VISION_RADIUS * 2 (с учетом шага группы) и цели групп региона
+    groups = {}
+    for row, x, y in _load_groups(positions_name, count, _window(world, rx, ry, 2 * HUMAN_VISION_RADIUS + 1)):
+        group = groups[row] = Group.__new__(Group)
+        group.x, group.y = x, y
+    for row, x, y in target_rows:
+        if row in groups: continue
+        group = groups[row] = Group.__new__(Group)
+        group.x, group.y = x, y
+    row_of = {id(group): row for row, group in groups.items()}
+    # Выбывшие группы, на которые еще нацелены живые, идут в конце таблицы и в поиск не попадают
+    alive = [groups[row] for row in sorted(groups) if row < alive_count]
+
+    group_results = []
+    for row, state in group_rows:
+        group = groups[row]
+        group.population, group.resources, group.inventory_capacity, group.state, kind, ref, \
+            group.reproduction_progress = state
+        if kind == TARGET_TILE: group.target = world.get_tile(*divmod(ref, world.height))
+        elif kind == TARGET_GROUP: group.target = groups[ref]
+        else: group.target = None
+        # Группа берет ресурс только с клетки, у которой стоит в начале хода
+        source = group.target.index if group.state == "gathering" and kind == TARGET_TILE else None
+        before = amounts[source] if source is not None else 0.0
+        group.update(world, alive)
+        taken = ((source, before - amounts[source]),) if source is not None and amounts[source] != before else ()
+        target = group.target
+        if target is None: kind, ref = TARGET_NONE, 0
+        elif isinstance(target, Group): kind, ref = TARGET_GROUP, row_of[id(target)]
+        else: kind, ref = TARGET_TILE, target.index
+        group_results.append((group.x, group.y, group.population, group.resources, group.inventory_capacity,
+                              group.state, kind, ref, group.reproduction_progress, taken))
+
+    settlement_results = []
+    for kind, x, y, population, resources, add_population_amount, indices in settlement_rows:
+        cls = SETTLEMENT_KINDS[kind]
+        s = cls.__new__(cls)
+        s.type, s.x, s.y, s.population, s.resources = kind, x, y, population, resources
+        s.gather_radius, s.add_population_amount = 0, add_population_amount
+        s.territory = Territory(world, (world.get_tile(*divmod(int(i), world.height)) for i in indices))
+        built = not s.territory
+        if built: s.update_territory(world) # новое племя получает территорию при первом обновлении
+        idx = s.territory.indices()
+        before = amounts[idx]
+        s.update(world)
+        gained = before - amounts[idx]
+        used = gained != 0
+        settlement_results.append((s.population, s.resources, s.progress_to_city,
+                                   idx if built else None, idx[used], gained[used]))
+    return group_results, settlement_results
+
+
+class ParallelUpdater:
+    """Пул процессов для фазы групп и поселений; запасы и типы ресурсов мира переносятся в общую память."""
+    def __init__(self, sim, workers):
+        self.sim = sim
+        world = sim.world
+        self.codes_shm, self.codes = _share(world.resource_codes, 'B')
+        self.amounts_shm, self.amounts = _share(world.resource_amounts, 'd')
+        # Владельцев и радиацию процессы только читают (для стоимости шага в полях расстояний)
+        self.owners_shm, self.owners = _share(world.owner_ids, 'i')
+        self.radioactive_shm, self.radioactive = _share(world.radioactive, 'B')
+        world.bind_arrays(self.codes, self.amounts, self.owners, self.radioactive)
+        self.positions_shm = None # координаты групп шага (int64 x, y по строкам таблицы)
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(
+            self.codes_shm.name, self.amounts_shm.name, self.owners_shm.name, self.radioactive_shm.name,
+            world.width, world.height))
+
+    def regions(self):
+        """Группы и поселения (кроме государств) по регионам: ключ (rx, ry) -> (группы, поселения)."""
+        regions = {}
+        for group in self.sim.groups:
+            key = (group.x // PARALLEL_REGION_SIZE, group.y // PARALLEL_REGION_SIZE)
+            regions.setdefault(key, ([], []))[0].append(group)
+        for s in self.sim.settlements:
+            if isinstance(s, State): continue
+            key = (s.x // PARALLEL_REGION_SIZE, s.y // PARALLEL_REGION_SIZE)
+            regions.setdefault(key, ([], []))[1].append(s)
+        return sorted(regions.items())
+
+    def update(self):
+        sim, world = self.sim, self.sim.world
+        table = list(sim.groups)
+        row_of = {id(group): row for row, group in enumerate(table)}
+        for group in sim.groups:
+            if isinstance(group.target, Group) and id(group.target) not in row_of:
+                row_of[id(group.target)] = len(table)
+                table.append(group.target)
+        self.publish_positions(table)
+
+        # Зерна регионов зависят только от общего генератора, а не от числа процессов
+        tick_seed = sim.rng.getrandbits(64)
+        regions = self.regions()
+        tasks = []
+        for (rx, ry), (groups, settlements) in regions:
+            group_rows = []
+            for group in groups:
+                target = group.target
+                if target is None: kind, ref = TARGET_NONE, 0
+                elif isinstance(target, Group): kind, ref = TARGET_GROUP, row_of[id(target)]
+                else: kind, ref = TARGET_TILE, target.index
+                group_rows.append((row_of[id(group)], (group.population, group.resources, group.inventory_capacity,
+                                                       group.state, kind, ref, group.reproduction_progress)))
+            settlement_rows = [(s.type, s.x, s.y, s.population, s.resources, s.add_population_amount,
+                                s.territory.indices()) for s in settlements]
+            # Цели-группы могут быть за окном соседей: их координаты идут с задачей
+            target_rows = [(row_of[id(g.target)], g.target.x, g.target.y) for g in groups if isinstance(g.target, Group)]
+            tasks.append((f"{tick_seed}:{rx}:{ry}", world.paths is not None, (rx, ry), self.positions_shm.name, len(table),
+                          len(sim.groups), target_rows, group_rows, settlement_rows))
+
+        # Все задачи читают запасы на начало фазы: сливать можно только после того, как отработали все
+        results = list(self.pool.map(_update_region, tasks))
+        for (key, (groups, settlements)), (group_results, settlement_results) in zip(regions, results):
+            for group, result in zip(groups, group_results):
+                self.merge_group(group, result, table)
+            for s, result in zip(settlements, settlement_results):
+                self.merge_settlement(s, result)
+
+    def publish_positions(self, table):
+        """Записывает координаты групп таблицы в общую память (блок растет по мере надобности)."""
+        needed = max(len(table), 1) * 16
+        if self.positions_shm is None or self.positions_shm.size < needed:
+            if self.positions_shm:
+                self.positions_shm.close()
+                self.positions_shm.unlink()
+            self.positions_shm = shared_memory.SharedMemory(create=True, size=2 * needed)
+        positions = np.ndarray((len(table), 2), dtype=np.int64, buffer=self.positions_shm.buf)
+        if table: positions[:] = [(group.x, group.y) for group in table]
+        del positions
+
+    def withdraw(self, i, wanted):
+        """Списывает с клетки до wanted ресурса; возвращает недостачу, если клетку уже опустошили другие."""
+        world = self.sim.world
+        available = world.resource_amounts[i]
+        granted = min(wanted, max(available, 0))
+        world.set_amount(i, available - granted)
+        return wanted - granted
+
+    def merge_group(self, group, result, table):
+        group.x, group.y, group.population, resources, group.inventory_capacity, \
+            group.state, kind, ref, group.reproduction_progress, taken = result
+        group.resources.update(resources)
+        if kind == TARGET_TILE: group.target = self.sim.world.get_tile(*divmod(ref, self.sim.world.height))
+        elif kind == TARGET_GROUP: group.target = table[ref]
+        else: group.target = None
+        for i, amount in taken:
+            shortfall = self.withdraw(i, amount)
+            if shortfall:
+                group.resources[self.sim.world.resource_codes[i]] -= shortfall
+
+    def merge_settlement(self, s, result):
+        s.population, resources, s.progress_to_city, territory, indices, gained = result
+        s.resources.update(resources)
+        if isinstance(s, City): s.progress_to_state = s.progress_to_city
+        world = self.sim.world
+        if territory is not None:
+            s.territory = Territory(world, (world.get_tile(*divmod(int(i), world.height)) for i in territory))
+        for i, amount in zip(indices.tolist(), gained.tolist()):
+            shortfall = self.withdraw(i, amount)
+            if shortfall:
+                # Клетка давала свой ресурс целиком и десятую часть в остальные
+                own = world.resource_codes[i]
+                for res in range(len(s.resources)):
+                    s.resources[res] -= shortfall if res == own else shortfall / 10
+
+    def close(self):
+        """Останавливает пул и возвращает мир на обычные массивы."""
+        self.pool.shutdown()
+        world = self.sim.world
+        world.bind_arrays(array('B', world.resource_codes.tobytes()), array('d', world.resource_amounts.tobytes()),
+                          array('i', world.owner_ids.tobytes()), array('B', world.radioactive.tobytes()))
+        for view in (self.codes, self.amounts, self.owners, self.radioactive): view.release()
+        for shm in (self.codes_shm, self.amounts_shm, self.owners_shm, self.radioactive_shm, self.positions_shm):
+            if shm is None: continue
+            shm.close()
+            shm.unlink()
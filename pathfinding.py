@@ -0,0 +1,105 @@
+"""Поля расстояний (flow fields) для движения к ресурсам.
+
+Карта делится на регионы по PATH_REGION_SIZE клеток. Для пары (тип ресурса, регион)
+один раз считается карта стоимости пути до ближайшей непустой клетки этого типа в окне
+региона, расширенном на PATH_FIELD_MARGIN клеток. Все, кто в регионе идет за тем же
+ресурсом, спускаются по одной карте: шаг - к соседу (по четырем направлениям, как
+move_towards) с меньшей стоимостью. Шаг по чужой земле стоит PATH_BORDER_COST, по
+зараженной - PATH_RADIATION_COST, по остальным клеткам - 1.
+
+Карты живут в кэше до события мира в их окне: опустошение или восстановление клетки
+сбрасывает карты ее ресурса, смена владельца и радиация - карты всех ресурсов."""
+import numpy as np
+from config import *
+from world import TILE_DEPLETED, TILE_REPLENISHED, TILE_OWNER_CHANGED, TILE_IRRADIATED, TILE_DECONTAMINATED
+
+NEIGHBOR_STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class FlowFields:
+    """Кэш полей расстояний мира: (код ресурса, rx, ry) -> (x0, y0, стоимости)."""
+    def __init__(self, world):
+        self.world = world
+        self.fields = {}
+        self.builds = 0 # сколько полей посчитано (для профилирования кэша)
+        world.subscribe(TILE_DEPLETED, self.source_changed)
+        world.subscribe(TILE_REPLENISHED, self.source_changed)
+        for event in (TILE_OWNER_CHANGED, TILE_IRRADIATED, TILE_DECONTAMINATED):
+            world.subscribe(event, self.cost_changed)
+
+    def window(self, rx, ry):
+        world = self.world
+        return (max(rx * PATH_REGION_SIZE - PATH_FIELD_MARGIN, 0), max(ry * PATH_REGION_SIZE - PATH_FIELD_MARGIN, 0),
+                min((rx + 1) * PATH_REGION_SIZE + PATH_FIELD_MARGIN, world.width),
+                min((ry + 1) * PATH_REGION_SIZE + PATH_FIELD_MARGIN, world.height))
+
+    def regions_around(self, i):
+        """Регионы, в окна которых попадает клетка i."""
+        x, y = divmod(i, self.world.height)
+        reach = PATH_FIELD_MARGIN // PATH_REGION_SIZE + 1
+        rx, ry = x // PATH_REGION_SIZE, y // PATH_REGION_SIZE
+        return [(ax, ay) for ax in range(rx - reach, rx + reach + 1) for ay in range(ry - reach, ry + reach + 1)]
+
+    def source_changed(self, i):
+        code = self.world.resource_codes[i]
+        for rx, ry in self.regions_around(i): self.fields.pop((code, rx, ry), None)
+
+    def cost_changed(self, i):
+        for rx, ry in self.regions_around(i):
+            for code in range(len(RESOURCE_TYPES)): self.fields.pop((code, rx, ry), None)
+
+    def field(self, code, rx, ry):
+        key = (code, rx, ry)
+        field = self.fields.get(key)
+        if field is None: field = self.fields[key] = self.build(code, rx, ry)
+        return field
+
+    def build(self, code, rx, ry):
+        """Стоимость пути до ближайшей клетки ресурса code в окне региона (inf - недостижимо)."""
+        world = self.world
+        x0, y0, x1, y1 = self.window(rx, ry)
+        shape = (world.width, world.height)
+        codes = world.codes_view.reshape(shape)[x0:x1, y0:y1]
+        amounts = world.amounts_view.reshape(shape)[x0:x1, y0:y1]
+        owners = np.frombuffer(world.owner_ids, dtype=np.int32).reshape(shape)[x0:x1, y0:y1]
+        radioactive = np.frombuffer(world.radioactive, dtype=np.uint8).reshape(shape)[x0:x1, y0:y1]
+        cost = np.where(radioactive != 0, PATH_RADIATION_COST, np.where(owners != 0, PATH_BORDER_COST, 1)).astype(np.float64)
+
+        # Релаксация до неподвижной точки: источники близко, поэтому итераций немного
+        dist = np.where((codes == code) & (amounts > 0), 0.0, np.inf)
+        while True:
+            nearest = np.full_like(dist, np.inf)
+            np.minimum(nearest[1:], dist[:-1], out=nearest[1:])
+            np.minimum(nearest[:-1], dist[1:], out=nearest[:-1])
+            np.minimum(nearest[:, 1:], dist[:, :-1], out=nearest[:, 1:])
+            np.minimum(nearest[:, :-1], dist[:, 1:], out=nearest[:, :-1])
+            relaxed = np.minimum(dist, nearest + cost)
+            if np.array_equal(relaxed, dist): break
+            dist = relaxed
+        self.builds += 1
+        return x0, y0, dist
+
+    def next_step(self, code, x, y):
+        """Соседняя клетка на пути к ближайшему ресурсу code; (x, y), если ресурс под ногами;
+        None, если в окне региона его нет."""
+        x0, y0, dist = self.field(code, x // PATH_REGION_SIZE, y // PATH_REGION_SIZE)
+        lx, ly = x - x0, y - y0
+        here = dist[lx, ly]
+        if here == 0: return (x, y)
+        if here == np.inf: return None
+        best, best_dist = None, here
+        width, height = dist.shape
+        for dx, dy in NEIGHBOR_STEPS:
+            nx, ny = lx + dx, ly + dy
+            if 0 <= nx < width and 0 <= ny < height and dist[nx, ny] < best_dist:
+                best, best_dist = (x + dx, y + dy), dist[nx, ny]
+        return best
+
+    def route(self, x, y, tile):
+        """Цель и следующая клетка для того, кто в (x, y) идет к клетке ресурса tile.
+        Поле ведет к ближайшей по стоимости клетке того же ресурса: дойдя до нее, сущность
+        берет целью ее. Если поле не помогает, шаг делается прямо к tile."""
+        step = self.next_step(self.world.resource_codes[tile.index], x, y)
+        if step is None: return tile, (tile.x, tile.y)
+        if step == (x, y): return self.world.get_tile(x, y), step
+        return tile, step
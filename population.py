@@ -0,0 +1,223 @@
+"""Люди столбцами: пакетное обновление потребностей, потребления, смерти и движения.
+
+HumanPopulation хранит координаты, голод, жажду, возраст, срок жизни и инвентарь
+в numpy-массивах и обновляет их разом для всех людей. Выбор цели, путь и сбор делают
+те же Human.decide и Human.approach, что и в обычном режиме: столбцы только подставляют
+координаты начала хода и то, кто умер, а ближайший человек ищется одним векторным
+обходом колец для всех, кому он нужен. Шаг к цели делается после того, как решили все,
+как и в Simulation.update_humans, поэтому оба режима идут одинаково. HumanRow -
+представление строки с тем же интерфейсом, что и у Human, для остального кода
+(интерфейс, снимки, уровни детализации)."""
+from functools import lru_cache
+import numpy as np
+from config import *
+from human import Human
+from geometry import distance_rings
+
+@lru_cache(maxsize=None)
+def _ring_arrays(radius):
+    """distance_rings(radius) массивами смещений: ((d2, dx, dy), ...)."""
+    return tuple((d2, np.array([d[0] for d in ring]), np.array([d[1] for d in ring]))
+                 for d2, ring in distance_rings(radius))
+
+
+class RowResources:
+    """Инвентарь строки с тем же интерфейсом, что у Resources: индекс - номер ресурса."""
+    __slots__ = ('human',)
+
+    def __init__(self, human): self.human = human
+
+    def __getitem__(self, res):
+        human = self.human
+        return float(human.columns.resources[human.row, res])
+
+    def __setitem__(self, res, value):
+        human = self.human
+        human.columns.resources[human.row, res] = value
+
+    def __iter__(self):
+        human = self.human
+        return iter(human.columns.resources[human.row].tolist())
+
+    def __len__(self): return len(RESOURCE_TYPES)
+
+    def get(self, res, default=None):
+        i = RESOURCE_IDS.get(res)
+        return default if i is None else self[i]
+
+    def items(self): return list(zip(RESOURCE_TYPES, self))
+    def total(self): return sum(self)
+
+
+def _column(name, cast):
+    def get(self): return cast(getattr(self.columns, name)[self.row])
+    def set(self, value): getattr(self.columns, name)[self.row] = value
+    return property(get, set)
+
+
+class HumanRow(Human):
+    """Человек, чьи числовые поля лежат в строке row столбцов columns (HumanPopulation).
+    Цель, занятие и флаг active остаются полями объекта."""
+    __slots__ = ('columns', 'row')
+    x = _column('x', int)
+    y = _column('y', int)
+    hunger = _column('hunger', float)
+    thirst = _column('thirst', float)
+    age = _column('age', float)
+    lifespan = _column('lifespan', float)
+
+    def __init__(self, columns, row):
+        self.columns, self.row = columns, row
+        self.resources = RowResources(self)
+        self.state = "searching_partner"
+        self.target = None
+        self.goal = None
+        self.active = True
+
+
+class HumanPopulation:
+    """Столбцы людей; строка i соответствует rows[i] и, между шагами, sim.humans[i]."""
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.rows = []
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        old = self.size
+        columns = {'x': np.int64, 'y': np.int64, 'hunger': np.float64, 'thirst': np.float64,
+                   'age': np.float64, 'lifespan': np.float64}
+        for name, dtype in columns.items():
+            column = np.zeros(capacity, dtype=dtype)
+            if old: column[:old] = getattr(self, name)[:old]
+            setattr(self, name, column)
+        resources = np.zeros((capacity, len(RESOURCE_TYPES)))
+        if old: resources[:old] = self.resources[:old]
+        self.resources = resources
+
+    def add(self, x, y, lifespan, hunger=0, thirst=0, age=0, resources=(5, 5, 0, 0)):
+        if self.size == len(self.x): self.allocate(2 * len(self.x))
+        i = self.size
+        self.x[i], self.y[i] = x, y
+        self.hunger[i], self.thirst[i], self.age[i], self.lifespan[i] = hunger, thirst, age, lifespan
+        self.resources[i] = resources
+        self.size += 1
+        human = HumanRow(self, i)
+        self.rows.append(human)
+        return human
+
+    def adopt(self, human):
+        """Переносит обычного Human в столбцы; возвращает его строку."""
+        row = self.add(human.x, human.y, human.lifespan, human.hunger, human.thirst, human.age,
+                       list(human.resources))
+        row.state, row.target, row.goal, row.active = human.state, human.target, human.goal, human.active
+        return row
+
+    def dead(self):
+        n = self.size
+        return (self.hunger[:n] >= 10) | (self.thirst[:n] >= 10) | (self.age[:n] >= self.lifespan[:n])
+
+    def positions(self, humans):
+        """Координаты строк humans списком пар (x, y)."""
+        rows = np.fromiter((h.row for h in humans), dtype=np.intp, count=len(humans))
+        return list(zip(self.x[rows].tolist(), self.y[rows].tolist()))
+
+    def update(self, world):
+        """Ход всех людей по порядку строк (он же порядок sim.humans)."""
+        n = self.size
+        if not n: return
+        self.age[:n] += 1
+        self.hunger[:n] += 0.4
+        self.thirst[:n] += 0.6
+        alive = ~self.dead()
+
+        food, water = self.resources[:n, FOOD], self.resources[:n, WATER]
+        eat = alive & (self.hunger[:n] > 5) & (food > 0)
+        food[eat] -= 1; self.hunger[:n][eat] -= 3
+        drink = alive & (self.thirst[:n] > 6) & (water > 0)
+        water[drink] -= 1; self.thirst[:n][drink] -= 4
+
+        rows = np.flatnonzero(alive).tolist()
+        xs, ys = self.x[:n].tolist(), self.y[:n].tolist()
+        self.decide(world, rows, xs, ys, (~alive).tolist())
+        # Сбор и путь - тем же Human.approach, из клеток начала хода
+        humans, tx, ty = self.rows, xs[:], ys[:]
+        for i in rows:
+            target_pos = humans[i].approach(world, xs[i], ys[i])
+            if target_pos: tx[i], ty[i] = target_pos
+
+        # Шаг по оси с большим отставанием, как в Human.move_towards
+        x, y = self.x[:n], self.y[:n]
+        dx, dy = np.array(tx) - x, np.array(ty) - y
+        along_x = np.abs(dx) > np.abs(dy)
+        x += np.where(along_x, np.sign(dx), 0)
+        y += np.where(along_x, 0, np.sign(dy))
+
+    def decide(self, world, rows, xs, ys, dead):
+        """Human.decide для живых строк rows по столбцам начала хода; ближайшие люди
+        для всех, кому они нужны, ищутся после обхода одним nearest_rows."""
+        n = self.size
+        humans = self.rows
+        hunger, thirst = self.hunger[:n].tolist(), self.thirst[:n].tolist()
+        carried = self.resources[:n].sum(axis=1).tolist()
+        def dead_target(target):
+            return dead[target.row] if isinstance(target, HumanRow) and target.columns is self else target.is_dead()
+        seekers = []
+        for i in rows:
+            need = Human.need_goal(hunger[i], thirst[i], carried[i])
+            if humans[i].decide(world, xs[i], ys[i], need, dead_target): seekers.append(i)
+        if seekers:
+            found = self.nearest_rows(np.array(seekers), HUMAN_VISION_RADIUS, world.width, world.height)
+            for i, j in zip(seekers, found.tolist()):
+                humans[i].target = humans[j] if j >= 0 else None
+
+    def nearest_rows(self, seekers, radius, width, height):
+        """Для строк seekers - ближайшая другая строка строго ближе radius, как в Occupancy.nearest
+        (при равенстве - меньшая строка); -1, если такой нет. Кольца обходятся разом для всех."""
+        n = self.size
+        tiles = self.x[:n] * height + self.y[:n]
+        order = np.argsort(tiles, kind='stable') # внутри клетки строки идут по возрастанию
+        keys = tiles[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], n]
+        occupied, first = keys[starts], order[starts]
+        # Вторая строка клетки нужна, когда первая - сам ищущий
+        second = np.where(starts + 1 < ends, order[np.minimum(starts + 1, n - 1)], n)
+
+        result = np.full(len(seekers), -1)
+        pending = np.arange(len(seekers))
+        qx, qy = self.x[seekers], self.y[seekers]
+        for d2, dx, dy in _ring_arrays(radius):
+            if not len(pending): break
+            cx, cy = qx[pending, None] + dx, qy[pending, None] + dy
+            tile = cx * height + cy
+            slot = np.minimum(np.searchsorted(occupied, tile), len(occupied) - 1)
+            hit = (cx >= 0) & (cx < width) & (cy >= 0) & (cy < height) & (occupied[slot] == tile)
+            candidate = np.where(hit, first[slot], n)
+            if d2 == 0:
+                candidate = np.where(candidate == seekers[pending, None], second[slot], candidate)
+            best = candidate.min(axis=1)
+            found = best < n
+            result[pending[found]] = best[found]
+            pending = pending[~found]
+        return result
+
+    def retain(self, humans):
+        """Оставляет в столбцах только humans (в их порядке); выбывшие строки
+        переезжают в отдельный архив, чтобы ссылки на них продолжали работать."""
+        keep = np.array([h.row for h in humans], dtype=np.intp)
+        kept = set(map(id, humans))
+        gone = [h for h in self.rows if id(h) not in kept]
+        if gone:
+            archive = HumanPopulation(len(gone))
+            rows = np.array([h.row for h in gone], dtype=np.intp)
+            for name in ('x', 'y', 'hunger', 'thirst', 'age', 'lifespan', 'resources'):
+                getattr(archive, name)[:len(gone)] = getattr(self, name)[rows]
+            archive.size, archive.rows = len(gone), gone
+            for j, h in enumerate(gone): h.columns, h.row = archive, j
+
+        k = len(keep)
+        for name in ('x', 'y', 'hunger', 'thirst', 'age', 'lifespan', 'resources'):
+            column = getattr(self, name)
+            column[:k] = column[keep]
+        self.size, self.rows = k, list(humans)
+        for i, h in enumerate(humans): h.row = i
@@ -0,0 +1,55 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class TickProfiler:
+    """Скользящая статистика длительности фаз шага (и отрисовки) за последние window замеров."""
+    def __init__(self, window=120):
+        self.window = window
+        self.samples = {} # фаза -> deque длительностей в секундах
+        self.counts = {} # численность сущностей на последнем шаге
+        self.enabled = True
+
+    def record(self, phase, seconds):
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    @contextmanager
+    def measure(self, phase):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def stats(self):
+        """Фаза -> среднее, p95 и максимум в миллисекундах."""
+        result = {}
+        # Снимки словаря и очередей: отрисовка читает их, пока поток симуляции пишет замеры
+        for phase, samples in list(self.samples.items()):
+            ordered = sorted(samples)
+            if not ordered: continue
+            result[phase] = {
+                'mean_ms': sum(ordered) / len(ordered) * 1000,
+                'p95_ms': ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+                'max_ms': ordered[-1] * 1000,
+                'samples': len(ordered),
+            }
+        return result
+
+    def report_lines(self):
+        lines = [f"{phase:<14}{s['mean_ms']:7.2f}{s['p95_ms']:7.2f}{s['max_ms']:7.2f}"
+                 for phase, s in self.stats().items()]
+        counts = ' '.join(f"{name}:{count}" for name, count in self.counts.items())
+        return [f"{'фаза, мс':<14}{'сред':>7}{'p95':>7}{'макс':>7}"] + lines + ([counts] if counts else [])
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'phases': self.stats(), 'counts': self.counts}, f, ensure_ascii=False, indent=2)
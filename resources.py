@@ -0,0 +1,27 @@
+from config import *
+
+
+class Resources(list):
+    """Запасы сущности: список из четырех чисел в порядке RESOURCE_TYPES.
+
+    В горячих местах индексируется номером ресурса как обычный список: resources[FOOD].
+    По именам ресурсов (интерфейс, стоимости из config) - через get, items и update."""
+    __slots__ = ()
+
+    def __init__(self, amounts=(0, 0, 0, 0)):
+        super().__init__(amounts)
+
+    def __repr__(self): return f"Resources({dict(self.items())})"
+
+    def get(self, res, default=None):
+        i = RESOURCE_IDS.get(res)
+        return default if i is None else self[i]
+
+    def items(self): return list(zip(RESOURCE_TYPES, self))
+    def total(self): return sum(self)
+
+    def update(self, other):
+        if isinstance(other, list):
+            self[:] = other
+        else:
+            for res, value in other.items(): self[RESOURCE_IDS[res]] = value
@@ -0,0 +1,83 @@
+"""Симуляция в отдельном потоке с фиксированным шагом по времени.
+
+Поток SimulationRunner SIM_STEP_RATE раз в секунду продвигает Simulation на speed
+вызовов update(speed) (как раньше за один кадр Game) и публикует неизменяемый
+кадр: координаты сущностей и счетчики. Цвета изменившихся клеток копятся до тех
+пор, пока их не заберет отрисовка, поэтому пропущенные кадры ничего не теряют.
+Отрисовка берет последний кадр в своем темпе и не ждет симуляцию."""
+import threading
+import time
+from collections import namedtuple
+from config import *
+from settlement import State
+
+# humans: ((x, y), ...); groups: ((x, y, population), ...); settlements: ((класс, x, y), ...)
+Frame = namedtuple('Frame', 'tick humans groups settlements humans_count groups_count settlements_count states_count')
+
+
+class SimulationRunner:
+    """Планировщик шагов симуляции в фоновом потоке.
+
+    lock держится на время одного update и публикации кадра: под ним же окно
+    меняет симуляцию (добавление людей) и читает живые объекты (выбор, панель)."""
+    def __init__(self, sim, speed=INITIAL_SPEED):
+        self.sim = sim
+        self.speed = speed
+        self.paused = False
+        self.lock = threading.Lock()
+        self._frame_lock = threading.Lock()
+        self._frame = None
+        self._colors = {} # индекс клетки -> цвет, еще не забранные отрисовкой
+        self._stop = threading.Event()
+        self._thread = None
+        with self.lock: self.publish(full=True)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='simulation', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        interval = 1 / SIM_STEP_RATE
+        next_time = time.perf_counter()
+        while not self._stop.is_set():
+            if not self.paused:
+                speed = self.speed
+                for _ in range(speed):
+                    if self._stop.is_set(): break
+                    with self.lock: self.sim.update(speed)
+            # Кадр публикуется и на паузе, чтобы были видны люди, добавленные мышью
+            with self.lock: self.publish()
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif -delay > SIM_MAX_LAG:
+                next_time = time.perf_counter() # шаги тяжелее интервала: не копим долг
+
+    def publish(self, full=False):
+        """Собирает кадр из текущего состояния (вызывается под self.lock)."""
+        sim, world = self.sim, self.sim.world
+        colors = world.take_colors(full)
+        # В пакетном режиме координаты людей читаются из столбцов разом
+        humans = sim.population.positions(sim.humans) if sim.population else [(h.x, h.y) for h in sim.humans]
+        frame = Frame(sim.tick,
+                      tuple(humans),
+                      tuple((g.x, g.y, g.population) for g in sim.groups),
+                      tuple((type(s), s.x, s.y) for s in sim.settlements),
+                      len(sim.humans), len(sim.groups), sum(not isinstance(s, State) for s in sim.settlements), len(sim.states))
+        with self._frame_lock:
+            self._frame = frame
+            self._colors.update(colors)
+
+    def take(self):
+        """Последний кадр и цвета клеток, изменившихся с прошлого вызова."""
+        with self._frame_lock:
+            colors, self._colors = self._colors, {}
+            return self._frame, colors
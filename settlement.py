@@ -1,6 +1,9 @@
 import pygame
+import numpy as np
 from config import *
-import random
+from territory import Territory
+from world import TILE_DEPLETED
+from geometry import disc_offsets
 
 
 tile_to_state = {}
@@ -8,12 +11,14 @@ tile_to_state = {}
 
 class Settlement:
     """Базовый класс для Племени, Города и Государства."""
+    __slots__ = ('type', 'x', 'y', 'population', 'resources', 'territory', 'gather_radius', 'add_population_amount')
+
     def __init__(self, x, y, population, resources):
         self.type = ''
         self.x, self.y = x, y
         self.population = population
         self.resources = resources
-        self.territory = []
+        self.territory = Territory()
         self.gather_radius = 0
         self.add_population_amount = 1
         self.update_territory(None)
@@ -25,41 +30,48 @@ class Settlement:
     def get_tiles_in_radius(self, world, tile, radius):
         tiles = []
         center_x, center_y = tile.x, tile.y
-        # Пробегаем квадрат вокруг точки
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                x, y = center_x + dx, center_y + dy
-                # Проверка выхода за границы мира
-                if 0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT:
-                    tile = world.get_tile(x, y)
-                    if tile:
-                        # Проверяем, находится ли тайл в круге радиуса R
-                        if (dx**2 + dy**2) <= radius**2:
-                            tiles.append(tile)
+        # Смещения круга радиуса R посчитаны заранее, get_tile отсекает выход за границы мира
+        for dx, dy in disc_offsets(radius):
+            tile = world.get_tile(center_x + dx, center_y + dy)
+            if tile:
+                tiles.append(tile)
         return tiles
     
     def gather_resources(self):
-        for tile in self.territory:
-            if tile.resource_amount > 0:
-                amount = min(tile.resource_amount, HUMAN_GATHER_SPEED * self.population / len(self.territory))
-                for resource in self.resources:
-                    if resource == tile.resource_type:
-                        self.resources[resource] += amount
-                        tile.resource_amount -= amount
-                    else:
-                        self.resources[resource] += amount / 10
+        # Каждая непустая клетка отдает min(запас, доля) своего ресурса и десятую часть
+        # этого в каждый другой ресурс. Считается разом для всей территории.
+        if not self.territory: return
+        world = self.territory.world
+        idx = self.territory.indices()
+        amounts = world.amounts_view[idx]
+        taken = amounts > 0
+        if not taken.any(): return
+        idx, amounts = idx[taken], amounts[taken]
+        amount = np.minimum(amounts, HUMAN_GATHER_SPEED * self.population / len(self.territory))
+        left = amounts - amount
+        world.amounts_view[idx] = left
+        # Запись идет мимо World.set_amount, поэтому об опустевших клетках сообщаем сами
+        for i in idx[left <= 0].tolist(): world.emit(TILE_DEPLETED, i)
+
+        codes = np.arange(len(RESOURCE_TYPES))
+        gained = np.where(world.codes_view[idx] == codes[:, None], amount, amount / 10)
+        # cumsum складывает последовательно, как прежний цикл по клеткам, - суммы совпадают до бита
+        start = np.array(self.resources, dtype=np.float64)
+        totals = np.cumsum(np.column_stack((start, gained)), axis=1)[:, -1]
+        self.resources[:] = totals.tolist()
     
 
     def update_population(self):
         food_needed = self.population * 0.1
         water_needed = self.population * 0.05
+        resources = self.resources
         
-        if self.resources['food'] < food_needed or self.resources['water'] < water_needed:
+        if resources[FOOD] < food_needed or resources[WATER] < water_needed:
             self.population -= 1
         else:
-            self.resources['food'] -= food_needed
-            self.resources['water'] -= water_needed
-            if self.population < self.get_max_population() and self.resources['food'] > self.population * 5 and self.resources['water'] > self.population * 5:
+            resources[FOOD] -= food_needed
+            resources[WATER] -= water_needed
+            if self.population < self.get_max_population() and resources[FOOD] > self.population * 5 and resources[WATER] > self.population * 5:
                 self.population += self.add_population_amount
     
     def update(self, world):
@@ -68,6 +80,8 @@ class Settlement:
         self.update_population()
 
 class Tribe(Settlement):
+    __slots__ = ('progress_to_city',)
+
     def __init__(self, group):
         super().__init__(group.x, group.y, group.population, group.resources)
         self.progress_to_city = 0
@@ -77,18 +91,22 @@ class Tribe(Settlement):
     def update_territory(self, world):
         if world:
             center_tile = world.get_tile(self.x, self.y)
-            if center_tile: self.territory = [center_tile] + world.get_neighbors(center_tile)
-    def draw(self, surface):
-        pos = (self.x * TILE_SIZE + TILE_SIZE // 2, self.y * TILE_SIZE + TILE_SIZE // 2)
+            if center_tile: self.territory = Territory(world, (center_tile, *world.get_neighbors(center_tile)))
+    def draw(self, surface): self.draw_at(surface, self.x, self.y)
+    @staticmethod
+    def draw_at(surface, x, y):
+        pos = (x * TILE_SIZE + TILE_SIZE // 2, y * TILE_SIZE + TILE_SIZE // 2)
         pygame.draw.circle(surface, COLORS['tribe'], pos, TILE_SIZE)
     def get_max_population(self): return TRIBE_MAX_POPULATION
     def update(self, world):
         super().update(world)
-        self.progress_to_city = sum(min(self.resources[res] / cost, 1) for res, cost in CITY_CREATION_RESOURCES.items()) / 2
+        self.progress_to_city = sum(min(self.resources.get(res) / cost, 1) for res, cost in CITY_CREATION_RESOURCES.items()) / 2
     def can_evolve(self):
         return all(self.resources.get(res, 0) >= cost for res, cost in CITY_CREATION_RESOURCES.items())
 
 class City(Tribe):
+    __slots__ = ('progress_to_state',)
+
     def __init__(self, tribe):
         
         super().__init__(tribe)
@@ -101,39 +119,44 @@ class City(Tribe):
     def update_territory(self, world):
         if world:
             center_tile = world.get_tile(self.x, self.y)
-            if center_tile: self.territory = [center_tile] + world.get_neighbors(center_tile, radius=2)
+            if center_tile: self.territory = Territory(world, (center_tile, *world.get_neighbors(center_tile, radius=2)))
 
-    def draw(self, surface):
-        rect = pygame.Rect(self.x * TILE_SIZE, self.y * TILE_SIZE, TILE_SIZE * 2, TILE_SIZE * 2)
-        rect.center = (self.x * TILE_SIZE + TILE_SIZE // 2, self.y * TILE_SIZE + TILE_SIZE // 2)
+    @staticmethod
+    def draw_at(surface, x, y):
+        rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE * 2, TILE_SIZE * 2)
+        rect.center = (x * TILE_SIZE + TILE_SIZE // 2, y * TILE_SIZE + TILE_SIZE // 2)
         pygame.draw.rect(surface, COLORS['city'], rect)
     def get_max_population(self): return CITY_MAX_POPULATION
     def update(self, world):
         super().update(world)
-        self.progress_to_state = self.progress_to_city = sum(min(self.resources[res] / cost, 1) for res, cost in STATE_CREATION_RESOURCES.items()) / 2
+        self.progress_to_state = self.progress_to_city = sum(min(self.resources.get(res) / cost, 1) for res, cost in STATE_CREATION_RESOURCES.items()) / 2
 
     def can_evolve(self):
         return all(self.resources.get(res, 0) >= cost for res, cost in STATE_CREATION_RESOURCES.items())
 
 class State(City):
+    __slots__ = ('color', 'diplomacy', 'border_tiles', 'technology_lvl', 'nuclear_bomb', 'nuclear_progress',
+                 'starting_nuclear_war', 'power_version', 'diplomacy_version',
+                 '_power_version', '_power', '_allies_version', '_allies', '_allies_key', '_allies_power')
+
     def __init__(self, city, color):
         super().__init__(city)
         self.color = color; self.diplomacy = {}
         self.type = 'State'
-        self.border_tiles = set()
+        self.border_tiles = {} # упорядоченное множество: клетка -> None
         self.add_population_amount = 300
         self.technology_lvl = 0
         self.nuclear_bomb = 0
         self.nuclear_progress = 0
         self.starting_nuclear_war = 0
-        self.neighbors_cache = {}
+        self.reset_power_cache()
 
     def update_territory(self, world):
         if world: 
             if not self.territory: 
                 center_tile = world.get_tile(self.x, self.y) 
                 if center_tile: 
-                    self.territory = [center_tile] + world.get_neighbors(center_tile, radius=3) 
+                    self.territory = Territory(world, (center_tile, *world.get_neighbors(center_tile, radius=3)))
                     for tile in self.territory: 
                         tile.owner_state = self
 
@@ -145,14 +168,50 @@ class State(City):
         # self.capacity = len(self.territory) * 20
 
     def draw(self, surface): pass
+    @staticmethod
+    def draw_at(surface, x, y): pass
     def get_max_population(self): return len(self.territory) * 20
-    def get_power(self): return (self.population + sum(self.resources.values()) / 10) * self.technology_lvl
+    # Кэш силы сверяется с версиями: power_version растет при изменении населения, ресурсов
+    # или технологий государства, diplomacy_version - при изменении его дипломатии
+    def reset_power_cache(self):
+        self.power_version = self.diplomacy_version = 0
+        self._power_version = self._allies_version = -1
+        self._power = self._allies_power = 0
+        self._allies = ()
+        self._allies_key = None
+
+    def mark_power_dirty(self): self.power_version += 1
+    def mark_diplomacy_dirty(self): self.diplomacy_version += 1
+
+    def get_power(self):
+        if self._power_version != self.power_version:
+            self._power = (self.population + sum(self.resources) / 10) * self.technology_lvl
+            self._power_version = self.power_version
+        return self._power
+
     def get_summary_power(self):
-        return sum([state.get_power() for state, diplomacy in self.diplomacy.items() if diplomacy == 'peace']) + self.get_power()
+        # Своя сила меняется почти каждый ход, а сумма союзников кэшируется по их версиям
+        if self._allies_version != self.diplomacy_version:
+            self._allies = tuple(state for state, diplomacy in self.diplomacy.items() if diplomacy == 'peace')
+            self._allies_version = self.diplomacy_version
+        key = (self.diplomacy_version, *(state.power_version for state in self._allies))
+        if key != self._allies_key:
+            self._allies_power = sum([state.get_power() for state in self._allies])
+            self._allies_key = key
+        return self._allies_power + self.get_power()
 
     def update_border_tiles(self, world):
-        self.border_tiles = {t for t in self.territory
-                            if any(n.owner_state != self for n in world.get_neighbors(t))}
+        self.border_tiles = {t: None for t in self.territory
+                             if any(n.owner_state != self for n in world.get_neighbors(t))}
+
+    def refresh_border(self, world, tile):
+        """Обновляет border_tiles после смены владельца tile: затронуты только она и ее соседи.
+        Вызывается из World.set_owner для прежнего и нового владельца клетки."""
+        for t in (tile, *world.get_neighbors(tile)):
+            if t in self.territory and any(n.owner_state != self for n in world.get_neighbors(t)):
+                self.border_tiles[t] = None
+            else:
+                self.border_tiles.pop(t, None)
     
 
     # def expand(self, world):
@@ -192,27 +251,20 @@ class State(City):
     def expand(self, world):
         if not all(self.resources.get(res, 0) >= cost for res, cost in STATE_EXPANSION_COST.items()):
             return
-        expandable = set()
+        expandable = {}
         for t in self.border_tiles:
-            key = (t.x, t.y, 1)
-            if key not in self.neighbors_cache:
-                self.neighbors_cache[key] = world.get_neighbors(t)
-            for n in self.neighbors_cache[key]:
+            for n in world.get_neighbors(t):
                 if n.owner_state is None:
-                    expandable.add(n)
+                    expandable[n] = None
         if not expandable:
             return
-        new_tile = random.choice(tuple(expandable))
+        new_tile = world.rng.choice(tuple(expandable))
         self.territory.append(new_tile)
         new_tile.owner_state = self
         tile_to_state[(new_tile.x, new_tile.y)] = self
-        self.border_tiles.add(new_tile)
-        for n in world.get_neighbors(new_tile):
-            if n.owner_state == self and all(nb.owner_state == self for nb in world.get_neighbors(n)):
-                self.border_tiles.discard(n)
         for res, cost in STATE_EXPANSION_COST.items():
-            self.resources[res] -= cost
-        self._power_dirty = True
+            self.resources[RESOURCE_IDS[res]] -= cost
+        self.mark_power_dirty()
 
 
     # def update_diplomacy(self, world):
@@ -248,14 +300,11 @@ class State(City):
     #         if other_state not in neighboring_states:
     #             del self.diplomacy[other_state]
     def update_diplomacy(self, world):
-        neighboring = set()
+        neighboring = {} # упорядоченное множество соседних государств
         for t in self.border_tiles:
-            key = (t.x, t.y, 1)
-            if key not in self.neighbors_cache:
-                self.neighbors_cache[key] = world.get_neighbors(t)
-            for n in self.neighbors_cache[key]:
+            for n in world.get_neighbors(t):
                 if n.owner_state and n.owner_state != self:
-                    neighboring.add(n.owner_state)
+                    neighboring[n.owner_state] = None
         for other in neighboring:
             if other not in self.diplomacy:
                 try:
@@ -263,11 +312,14 @@ class State(City):
                     status = 'war' if ratio > 1.2 or ratio < 0.8 else 'peace'
                     self.diplomacy[other] = status
                     other.diplomacy[self] = status
+                    self.mark_diplomacy_dirty()
+                    other.mark_diplomacy_dirty()
                 except ZeroDivisionError:
                     pass
         for s in list(self.diplomacy.keys()):
             if s not in neighboring:
                 del self.diplomacy[s]
+                self.mark_diplomacy_dirty()
     
     def handle_wars(self, world, states):
         for enemy, status in self.diplomacy.items():
@@ -285,7 +337,7 @@ class State(City):
                 continue  # нет прямого контакта на границе
             
             # Выбираем случайную пару
-            attacker_tile, defender_tile = random.choice(border_pairs)
+            attacker_tile, defender_tile = world.rng.choice(border_pairs)
             
             # Определяем победителя с учётом силы
             attacker_power = self.get_summary_power()
@@ -293,7 +345,7 @@ class State(City):
             total = attacker_power + defender_power
             win_chance = attacker_power / total
             
-            if random.random() < win_chance:
+            if world.rng.random() < win_chance:
                 winner, loser = self, enemy
                 winner_tile, loser_tile = attacker_tile, defender_tile
             else:
@@ -313,16 +365,17 @@ class State(City):
             loss_ratio = 0.01  # 1% потерь
             winner.population = max(1, int(winner.population * (1 - loss_ratio)))
             loser.population = max(1, int(loser.population * (1 - loss_ratio)))
-            for res in winner.resources:
-                winner.resources[res] = max(0, int(winner.resources[res] * (1 - loss_ratio)))
-            for res in loser.resources:
-                loser.resources[res] = max(0, int(loser.resources[res] * (1 - loss_ratio)))
+            winner.resources[:] = [max(0, int(amount * (1 - loss_ratio))) for amount in winner.resources]
+            loser.resources[:] = [max(0, int(amount * (1 - loss_ratio))) for amount in loser.resources]
+            winner.mark_power_dirty()
+            loser.mark_power_dirty()
 
-            # После войны нужно обновить border_tiles
-            self.update_border_tiles(world)
+            # Смена владельца обновила границы прежнего и нового хозяина клетки; но клетка могла
+            # числиться за проигравшим, принадлежа уже третьему, - тогда его границу правим сами
+            winner.refresh_border(world, loser_tile)
 
             try:
-                enemy.update_border_tiles(world)
+                loser.refresh_border(world, loser_tile)
                 if not loser.territory:
                     states.remove(loser)
                     break
@@ -331,12 +384,14 @@ class State(City):
 
     def update_technology_lvl(self):
         if self.technology_lvl < MAX_TECHNOLOGY_LVL:
+            level = self.technology_lvl
             self.technology_lvl += self.population / 300 / 100
             for state, diplomacy in self.diplomacy.items():
                 if diplomacy == 'peace':
                     self.technology_lvl += state.technology_lvl / MAX_TECHNOLOGY_LVL / 100
                 else:
                     self.technology_lvl -= state.technology_lvl / MAX_TECHNOLOGY_LVL / 100
+            if self.technology_lvl != level: self.mark_power_dirty()
         if self.technology_lvl >= MAX_TECHNOLOGY_LVL:
             self.create_nuclear_bomb()
 
@@ -348,21 +403,24 @@ class State(City):
         if self.starting_nuclear_war == 1:
             if self.nuclear_bomb >= 1:
                 for state in [state for state, diplomacy in self.diplomacy.items() if diplomacy == 'war']:
-                    target_tile = random.choice(state.territory)
+                    target_tile = world.rng.choice(state.territory)
                     self.nuclear_bomb -= 1
                     world.nuclear_explosion(target_tile)
 
     def update(self, world, states):
         if self.population > 0 and self.territory:
+            before = (self.population, *self.resources)
             self.gather_resources()
-            if len(self.territory) < 1000:
-                self.update_population()
-
-                if self.population <= 0:
-                    for tile in self.territory: tile.owner_state = None
-
-                self.expand(world)
-                self.update_diplomacy(world)
-                self.update_technology_lvl()
-                self.handle_wars(world, states)
-                self.check_nuclear_progress(world)
+            if len(self.territory) < 1000: self.update_population()
+            if (self.population, *self.resources) != before: self.mark_power_dirty()
+            if len(self.territory) >= 1000: return
+
+            if self.population <= 0:
+                for tile in self.territory:
+                    tile.owner_state = None
+
+            self.expand(world)
+            self.update_diplomacy(world)
+            self.update_technology_lvl()
+            self.handle_wars(world, states)
+            self.check_nuclear_progress(world)
@@ -0,0 +1,344 @@
+import argparse
+import random
+import time
+from world import World
+from config import *
+from settlement import *
+from human import Human, Group
+from spatial import SpatialHash, near_mask
+from profiler import TickProfiler
+from parallel import ParallelUpdater
+from population import HumanPopulation
+from lod import LevelOfDetail
+from telemetry import Telemetry
+from pathfinding import FlowFields
+from geometry import dist2
+
+
+# --- Ядро симуляции без отрисовки ---
+class Simulation:
+    """Состояние мира и логика тиков, не зависящие от окна pygame."""
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None, world=None):
+        """seed задает генератор случайных чисел всей симуляции; world - готовый мир (при загрузке снимка)."""
+        self.rng = random.Random(seed)
+        if world is None:
+            world = World(width, height, self.rng)
+        world.rng = self.rng
+        self.world = world
+        self.humans = []
+        self.groups = []
+        self.settlements = []
+        self.states = []
+        self.tick = 0
+        self.profiler = TickProfiler()
+        self.parallel = None # пул процессов для групп и поселений, см. start_workers
+        self.population = None # столбцы людей для пакетного обновления, см. use_population
+        self.lod = None # упрощенная модель для регионов вне внимания, см. use_lod
+        self.telemetry = None # метрики шагов (Telemetry), снимаются после каждого шага
+
+    def start_workers(self, workers):
+        """Включает параллельный шаг групп и поселений (кроме государств) на workers процессах."""
+        self.stop_workers()
+        self.parallel = ParallelUpdater(self, workers)
+
+    def stop_workers(self):
+        if self.parallel:
+            self.parallel.close()
+            self.parallel = None
+
+    def use_population(self):
+        """Переводит людей в столбцы HumanPopulation: потребности, смерть и шаги считаются
+        numpy разом для всех, по отдельности остается только выбор цели."""
+        if self.population: return
+        self.population = HumanPopulation(max(64, len(self.humans)))
+        rows = {id(h): self.population.adopt(h) for h in self.humans}
+        for row in self.population.rows:
+            if isinstance(row.target, Human) and id(row.target) in rows: row.target = rows[id(row.target)]
+        self.humans = list(self.population.rows)
+        self.world.occupancy.rebuild(self)
+
+    def use_lod(self, focus=None):
+        """Включает уровни детализации: вне focus (x0, y0, x1, y1) и поселений люди и группы
+        сворачиваются в численность по регионам и продвигаются реже."""
+        if self.lod is None: self.lod = LevelOfDetail(self, focus)
+        else: self.lod.focus = focus
+
+    def use_paths(self):
+        """Включает движение к ресурсам по общим полям расстояний вместо шага напрямую к цели."""
+        if self.world.paths is None: self.world.paths = FlowFields(self.world)
+
+    def add_human(self, x, y):
+        if self.population:
+            human = self.population.add(x, y, self.rng.uniform(HUMAN_LIFESPAN[0], HUMAN_LIFESPAN[1]))
+        else:
+            human = Human(x, y, self.rng)
+        self.humans.append(human)
+        self.world.occupancy.add('humans', human)
+        return human
+
+    def spawn_humans(self, count):
+        for _ in range(count):
+            self.add_human(self.rng.randrange(self.world.width), self.rng.randrange(self.world.height))
+
+    def check_borders(self):
+        """Сверяет границы государств, которые ведутся по событиям, с пересчетом с нуля;
+        возвращает государства, у которых они разошлись."""
+        broken = []
+        for state in self.states:
+            kept = state.border_tiles
+            state.update_border_tiles(self.world)
+            if kept.keys() != state.border_tiles.keys(): broken.append(state)
+            state.border_tiles = kept
+        return broken
+
+    def generate_state_color(self, existing_colors):
+        # На больших картах государств больше, чем различимых цветов: после 1000 попыток берем любой
+        for _ in range(1000):
+            color = (self.rng.randint(50, 255), self.rng.randint(50, 255), self.rng.randint(50, 255))
+            if all(sum(abs(c1 - c2) for c1, c2 in zip(color, ex)) > 120 for ex in existing_colors):
+                return color
+        return color
+
+    def update(self, speed=1):
+        """Продвигает счетчик на speed тиков; реальный шаг выполняется раз в TICK_STEP тиков."""
+        self.tick += speed
+        if self.tick % TICK_STEP < speed:
+            self.step()
+
+    def phases(self):
+        """Фазы шага по порядку: (имя, метод). Используется шагом и замерами производительности."""
+        return (
+            # Обновление всех сущностей
+            ('humans', self.update_humans),
+            ('groups', self.update_groups),
+            ('settlements', self.update_settlements),
+            # Социальная динамика и эволюция
+            ('social', self.update_social_dynamics),
+            # Свертка и развертка регионов (при включенных уровнях детализации)
+            *((('lod', self.lod.update),) if self.lod else ()),
+            # Очистка мертвых
+            ('cleanup', self.remove_dead),
+            # Таймеры мира: восстановление ресурсов и распад радиации
+            ('world', self.world.advance),
+        )
+
+    def step(self):
+        profiler = self.profiler
+        step_start = time.perf_counter()
+        if not profiler.enabled:
+            for name, phase in self.phases(): phase()
+        else:
+            for name, phase in self.phases():
+                start = time.perf_counter()
+                phase()
+                profiler.record(name, time.perf_counter() - start)
+            profiler.record('step', time.perf_counter() - step_start)
+            profiler.counts = {'humans': len(self.humans), 'groups': len(self.groups),
+                               'settlements': len(self.settlements), 'states': len(self.states)}
+        if self.telemetry: self.telemetry.sample(self, time.perf_counter() - step_start)
+
+    def update_humans(self):
+        if self.population:
+            self.population.update(self.world)
+            return
+        # Сначала решают все, потом все шагают - тот же порядок, что и в HumanPopulation.update
+        world = self.world
+        humans = [h for h in self.humans if h.live()]
+        for h in humans:
+            if h.decide(world, h.x, h.y, Human.need_goal(h.hunger, h.thirst, sum(h.resources))):
+                h.target = h.find_nearest_human(world)
+        steps = [(h, h.approach(world, h.x, h.y)) for h in humans]
+        for h, target_pos in steps:
+            if target_pos:
+                old_pos = (h.x, h.y)
+                h.move_towards(target_pos)
+                world.occupancy.move('humans', h, old_pos)
+
+    def update_groups(self):
+        if self.parallel:
+            # Вместе с группами обновляются племена и города; государства - в update_settlements
+            self.parallel.update()
+            return
+        for group in self.groups: group.update(self.world, self.groups)
+
+    def update_settlements(self):
+        for s in self.settlements:
+            if isinstance(s, State):
+                s.update(self.world, self.states)
+            else:
+                if not self.parallel: s.update(self.world)
+
+                if hasattr(s, 'can_evolve') and s.can_evolve():
+                    if isinstance(s, City):
+                        color = self.generate_state_color([st.color for st in self.states])
+                        new_state = State(s, color)
+                        self.states.append(new_state)
+                        self.settlements.append(new_state)
+                        self.settlements.remove(s)
+                        new_state.update_territory(self.world)
+                        new_state.update_border_tiles(self.world)
+                    elif isinstance(s, Tribe):
+                        self.settlements.append(City(s))
+                        self.settlements.remove(s)
+
+    def remove_dead(self):
+        if self.population:
+            # Заодно столбцы сжимаются до тех, кто остался после social (ушедшие в группы тоже выбывают)
+            dead = self.population.dead().tolist()
+            self.humans = [h for h in self.humans if not dead[h.row]]
+            self.population.retain(self.humans)
+        else:
+            self.humans = [h for h in self.humans if not h.is_dead()]
+        self.groups = [g for g in self.groups if g.population > 0]
+        self.settlements = [s for s in self.settlements if s.population > 0]
+        self.states = [s for s in self.states if s in self.settlements]
+        # Занятость клеток пересобирается по итогам шага: к выбору мышью и следующему ходу людей
+        self.world.occupancy.rebuild(self)
+
+    def update_social_dynamics(self):
+        # Поиск соседей через сетку с ячейкой по наибольшему радиусу взаимодействия.
+        # Кандидаты сортируются по индексу в списке, чтобы сохранить прежний порядок обхода.
+
+        # Люди в сетке - номерами в списке, координаты - списком пар (в пакетном режиме из столбцов)
+        humans = self.humans
+        positions = self.population.positions(humans) if self.population else [h.get_pos() for h in humans]
+
+        # 1. Формирование групп из людей
+        # Соседи соседей тоже не одиноки, поэтому в сетку кладутся только те, у кого они есть
+        crowded = near_mask(positions, positions, 2, same=True)
+        grid = SpatialHash(SOCIAL_HASH_CELL)
+        for i, (x, y) in enumerate(positions):
+            if crowded[i]: grid.insert(x, y, i)
+        joined = [False] * len(humans)
+        for i, pos in enumerate(positions):
+            if joined[i] or not crowded[i]: continue
+            near = [j for j in grid.query(pos[0], pos[1], 2) if j != i and dist2(pos, positions[j]) < 4]
+            partners = [i] + sorted(near)
+            
+            if len(partners) >= GROUP_CREATION_MEMBERS:
+                avg_x = int(sum(positions[j][0] for j in partners) / len(partners))
+                avg_y = int(sum(positions[j][1] for j in partners) / len(partners))
+                self.groups.append(Group(avg_x, avg_y, [humans[j] for j in partners]))
+                for j in partners:
+                    humans[j].active = False
+                    joined[j] = True
+        kept = [i for i in range(len(humans)) if not joined[i]]
+        humans = self.humans = [humans[i] for i in kept]
+        positions = [positions[i] for i in kept]
+
+        # 2. Присоединение людей к группам
+        order = {g: i for i, g in enumerate(self.groups)}
+        grid = SpatialHash(SOCIAL_HASH_CELL, self.groups)
+        r2 = GROUP_JOIN_RADIUS**2
+        joined = [False] * len(humans)
+        near_group = near_mask(positions, [g.get_pos() for g in self.groups], GROUP_JOIN_RADIUS)
+        for k, (human, pos) in enumerate(zip(humans, positions)):
+            if not near_group[k]: continue
+            near = [g for g in grid.query(pos[0], pos[1], GROUP_JOIN_RADIUS)
+                    if dist2(pos, g.get_pos()) < r2]
+            if near:
+                group = min(near, key=order.__getitem__)
+                group.population += 1
+                for i, amount in enumerate(human.resources): group.resources[i] += amount
+                human.active = False
+                joined[k] = True
+        self.humans = [h for h, gone in zip(humans, joined) if not gone]
+
+        # 3. Взаимодействие групп
+        to_remove_g, checked_g = set(), set()
+        for g1 in self.groups:
+            if g1 in checked_g: continue
+            near = [g2 for g2 in grid.query(g1.x, g1.y, 3)
+                    if g1 != g2 and g2 not in checked_g and dist2(g1.get_pos(), g2.get_pos()) < 9]
+            if near:
+                g2 = min(near, key=order.__getitem__)
+                # Война или слияние
+                if g1.get_strength() > g2.get_strength() * 1.5: # Война - сильный побеждает
+                    g1.population += g2.population * 0.5 # Поглощает половину
+                    for i, amount in enumerate(g2.resources): g1.resources[i] += amount
+                    to_remove_g.add(g2)
+                elif g2.get_strength() > g1.get_strength() * 1.5:
+                    g2.population += g1.population * 0.5
+                    for i, amount in enumerate(g1.resources): g2.resources[i] += amount
+                    to_remove_g.add(g1)
+                else: # Слияние
+                    g1.population += g2.population
+                    for i, amount in enumerate(g2.resources): g1.resources[i] += amount
+                    to_remove_g.add(g2)
+
+                checked_g.add(g1); checked_g.add(g2)
+        self.groups = [g for g in self.groups if g not in to_remove_g]
+
+
+        # 4. Эволюция групп в племена
+        to_remove_g = set()
+        for group in self.groups:
+            if group.can_evolve():
+                self.settlements.append(Tribe(group))
+                to_remove_g.add(group)
+        self.groups = [g for g in self.groups if g not in to_remove_g]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция без окна: прогоняет N шагов с максимальной скоростью.")
+    parser.add_argument('--ticks', type=int, default=1000, help="количество шагов симуляции (по TICK_STEP тиков)")
+    parser.add_argument('--humans', type=int, default=500, help="сколько людей расселить в начале")
+    parser.add_argument('--width', type=int, default=GRID_WIDTH, help="ширина мира в клетках")
+    parser.add_argument('--height', type=int, default=GRID_HEIGHT, help="высота мира в клетках")
+    parser.add_argument('--seed', type=int, default=None, help="зерно генератора случайных чисел")
+    parser.add_argument('--load', help="продолжить с сохраненного снимка (.npz)")
+    parser.add_argument('--save', help="куда сохранить снимок (.npz) в конце и на контрольных точках")
+    parser.add_argument('--checkpoint-every', type=int, default=0, help="сохранять снимок каждые N шагов")
+    parser.add_argument('--population', action='store_true', help="пакетное обновление людей столбцами numpy")
+    parser.add_argument('--lod', action='store_true', help="упрощенная модель для регионов вне --focus и без поселений")
+    parser.add_argument('--focus', type=int, nargs=4, metavar=('X0', 'Y0', 'X1', 'Y1'), help="подробная область для --lod")
+    parser.add_argument('--paths', action='store_true', help="движение к ресурсам по полям расстояний (обход границ и радиации)")
+    parser.add_argument('--telemetry', help="куда дописывать метрики шагов (CSV)")
+    parser.add_argument('--telemetry-every', type=int, default=1, help="снимать метрики каждые N шагов")
+    parser.add_argument('--workers', type=int, default=0, help="процессов для параллельного шага групп и поселений (0 - без пула)")
+    parser.add_argument('--check-borders', action='store_true', help="после каждого шага сверять границы государств с пересчетом")
+    parser.add_argument('--profile', help="куда записать статистику фаз (JSON) в конце прогона")
+    args = parser.parse_args()
+
+    from snapshot import save_snapshot, load_snapshot
+    if args.load:
+        sim = load_snapshot(args.load)
+    else:
+        sim = Simulation(args.width, args.height, seed=args.seed)
+        sim.spawn_humans(args.humans)
+    if args.population:
+        sim.use_population()
+    if args.paths:
+        sim.use_paths()
+    if args.telemetry:
+        sim.telemetry = Telemetry(args.telemetry, args.telemetry_every)
+    if args.lod:
+        sim.use_lod(args.focus)
+    if args.workers:
+        sim.start_workers(args.workers)
+    start = time.perf_counter()
+    try:
+        for step in range(1, args.ticks + 1):
+            sim.update(TICK_STEP)
+            if args.check_borders:
+                broken = sim.check_borders()
+                if broken:
+                    raise AssertionError(f"шаг {step}: границы разошлись у государств в " +
+                                         ", ".join(f"({s.x}, {s.y})" for s in broken))
+            if args.save and args.checkpoint_every and step % args.checkpoint_every == 0:
+                save_snapshot(sim, args.save)
+    finally:
+        sim.stop_workers()
+        if sim.telemetry: sim.telemetry.close()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    if args.save:
+        save_snapshot(sim, args.save)
+    if args.profile:
+        sim.profiler.dump(args.profile)
+    print(f"{args.ticks} шагов за {elapsed:.2f} с ({args.ticks / elapsed:.1f} шаг/с) | "
+          f"Люди: {len(sim.humans)} | Группы: {len(sim.groups)} | "
+          f"Поселения: {len(sim.settlements)} | Государства: {len(sim.states)}" +
+          (f" | Свернуто регионов: {len(sim.lod.aggregates)}" if sim.lod else ""))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""Сохранение и загрузка полного состояния симуляции.
+
+Снимок - один сжатый .npz: столбцы клеток мира и его таймеры, таблицы людей, групп,
+поселений и государств, свернутые регионы уровней детализации, граф дипломатии,
+состояние генератора случайных чисел и номер тика.
+Ссылки между объектами (цели, владельцы клеток, дипломатия) хранятся номерами строк."""
+from array import array
+import numpy as np
+from config import *
+from world import World
+from human import Human, Group
+from settlement import Tribe, City, State
+from territory import Territory
+from resources import Resources
+from lod import RegionAggregate
+from simulation import Simulation
+
+SNAPSHOT_VERSION = 2
+
+HUMAN_GOALS = [None, 'water', 'food'] + HUMAN_IDLE_GOALS
+GROUP_STATES = ['searching_resource', 'moving', 'gathering']
+DIPLOMACY_STATUSES = ['peace', 'war']
+SETTLEMENT_KINDS = [Tribe, City, State]
+
+# Вид цели в таблицах: нет, клетка (индекс клетки), человек/группа (строка таблицы)
+TARGET_NONE, TARGET_TILE, TARGET_ENTITY = 0, 1, 2
+
+
+def _collect(listed, extra):
+    """Строки таблицы: сначала живые объекты из списка, затем те, на кого еще ссылаются."""
+    rows = list(listed)
+    seen = {id(obj) for obj in rows}
+    for obj in extra:
+        if obj is not None and id(obj) not in seen:
+            seen.add(id(obj))
+            rows.append(obj)
+    return rows
+
+
+def _encode_targets(objs, entity_cls, row_of):
+    kinds = np.zeros(len(objs), dtype=np.uint8)
+    refs = np.zeros(len(objs), dtype=np.int64)
+    for i, obj in enumerate(objs):
+        target = obj.target
+        if isinstance(target, entity_cls):
+            # Цели выбывших объектов, на которых больше никто не ссылается, не нужны
+            if id(target) in row_of: kinds[i], refs[i] = TARGET_ENTITY, row_of[id(target)]
+        elif target is not None:
+            kinds[i], refs[i] = TARGET_TILE, target.index
+    return kinds, refs
+
+
+def _decode_target(world, table, kind, ref):
+    if kind == TARGET_TILE: return world.get_tile(*divmod(int(ref), world.height))
+    if kind == TARGET_ENTITY: return table[ref]
+    return None
+
+
+def _resources(objs):
+    return np.array([list(obj.resources) for obj in objs], dtype=np.float64).reshape(-1, len(RESOURCE_TYPES))
+
+
+def _ragged(lists):
+    """Список списков -> (плоский массив, смещения)."""
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(items) for items in lists])
+    flat = np.fromiter((v for items in lists for v in items), dtype=np.int64, count=int(offsets[-1]))
+    return flat, offsets
+
+
+def save_snapshot(sim, path):
+    world = sim.world
+
+    # Все объекты, на которые есть ссылки, попадают в таблицы, даже если уже выбыли из симуляции
+    humans = _collect(sim.humans, [h.target for h in sim.humans if isinstance(h.target, Human)])
+    groups = _collect(sim.groups, [g.target for g in sim.groups if isinstance(g.target, Group)])
+    states = _collect(world.state_by_id[1:], [s for s in sim.settlements if isinstance(s, State)])
+    i = 0
+    while i < len(states):
+        states = _collect(states, states[i].diplomacy)
+        i += 1
+    others = [s for s in sim.settlements if not isinstance(s, State)]
+
+    human_row = {id(h): i for i, h in enumerate(humans)}
+    group_row = {id(g): i for i, g in enumerate(groups)}
+    state_row = {id(s): i for i, s in enumerate(states)}
+    other_row = {id(s): i for i, s in enumerate(others)}
+
+    # Владельцы клеток: номера state_by_id совпадают со строками таблицы государств + 1
+    registered = len(world.state_by_id) - 1
+
+    rng_version, rng_internal, rng_gauss = sim.rng.getstate()
+    h_kinds, h_refs = _encode_targets(humans, Human, human_row)
+    g_kinds, g_refs = _encode_targets(groups, Group, group_row)
+    territory_flat, territory_offsets = _ragged([[t.index for t in s.territory] for s in others + states])
+    border_flat, border_offsets = _ragged([[t.index for t in s.border_tiles] for s in states])
+    edges = [(state_row[id(s)], state_row[id(other)], DIPLOMACY_STATUSES.index(status))
+             for s in states for other, status in s.diplomacy.items()]
+    lod = sim.lod
+    aggregates = sorted(lod.aggregates.items()) if lod else []
+
+    np.savez_compressed(
+        path,
+        version=SNAPSHOT_VERSION,
+        tick=sim.tick,
+        size=np.array([world.width, world.height]),
+        rng_state=np.array(rng_internal, dtype=np.int64),
+        rng_meta=np.array([rng_version, np.nan if rng_gauss is None else rng_gauss]),
+        # Клетки
+        resource_codes=np.frombuffer(world.resource_codes, dtype=np.uint8),
+        resource_amounts=np.frombuffer(world.resource_amounts, dtype=np.float64),
+        owner_ids=np.frombuffer(world.owner_ids, dtype=np.int32),
+        radioactive=np.frombuffer(world.radioactive, dtype=np.uint8),
+        timers_now=world.timers.now,
+        timers=np.array(world.timers.entries(), dtype=np.int64).reshape(-1, 3),
+        # Люди
+        humans_listed=len(sim.humans),
+        human_pos=np.array([(h.x, h.y) for h in humans], dtype=np.int64).reshape(-1, 2),
+        human_needs=np.array([(h.hunger, h.thirst, h.age, h.lifespan) for h in humans], dtype=np.float64).reshape(-1, 4),
+        human_resources=_resources(humans),
+        human_goal=np.array([HUMAN_GOALS.index(h.goal) for h in humans], dtype=np.uint8),
+        human_active=np.array([h.active for h in humans], dtype=bool),
+        human_target_kind=h_kinds, human_target_ref=h_refs,
+        # Группы
+        groups_listed=len(sim.groups),
+        group_pos=np.array([(g.x, g.y) for g in groups], dtype=np.int64).reshape(-1, 2),
+        group_values=np.array([(g.population, g.inventory_capacity, g.reproduction_progress) for g in groups], dtype=np.float64).reshape(-1, 3),
+        group_resources=_resources(groups),
+        group_state=np.array([GROUP_STATES.index(g.state) for g in groups], dtype=np.uint8),
+        group_target_kind=g_kinds, group_target_ref=g_refs,
+        # Поселения: сначала племена и города, затем государства; общий формат строк
+        settlement_kind=np.array([SETTLEMENT_KINDS.index(type(s)) for s in others + states], dtype=np.uint8),
+        settlement_pos=np.array([(s.x, s.y) for s in others + states], dtype=np.int64).reshape(-1, 2),
+        settlement_values=np.array([(s.population, s.add_population_amount, s.gather_radius,
+                                     s.progress_to_city, getattr(s, 'progress_to_state', 0))
+                                    for s in others + states], dtype=np.float64).reshape(-1, 5),
+        settlement_resources=_resources(others + states),
+        territory_flat=territory_flat, territory_offsets=territory_offsets,
+        states_registered=registered,
+        state_color=np.array([s.color for s in states], dtype=np.uint8).reshape(-1, 3),
+        state_values=np.array([(s.technology_lvl, s.nuclear_bomb, s.nuclear_progress, s.starting_nuclear_war)
+                               for s in states], dtype=np.float64).reshape(-1, 4),
+        border_flat=border_flat, border_offsets=border_offsets,
+        diplomacy=np.array(edges, dtype=np.int64).reshape(-1, 3),
+        # Порядок списков симуляции: строки поселений (state: строка + len(others)) и государств
+        settlement_order=np.array([other_row[id(s)] if id(s) in other_row else len(others) + state_row[id(s)]
+                                   for s in sim.settlements], dtype=np.int64),
+        state_order=np.array([state_row[id(s)] for s in sim.states], dtype=np.int64),
+        # Уровни детализации: шаг, область просмотра (-1 - нет), свернутые и недавно поднятые регионы
+        lod_meta=np.array([lod.steps, *(lod.focus or (-1, -1, -1, -1))] if lod else [], dtype=np.int64),
+        lod_regions=np.array([key for key, agg in aggregates], dtype=np.int64).reshape(-1, 2),
+        lod_values=np.array([(agg.humans, agg.groups, agg.population, *agg.resources)
+                             for key, agg in aggregates], dtype=np.float64).reshape(-1, 3 + len(RESOURCE_TYPES)),
+        lod_active=np.array([(*key, until) for key, until in sorted(lod.active_until.items())] if lod else [],
+                            dtype=np.int64).reshape(-1, 3),
+    )
+
+
+def _number(value):
+    """Число из снимка обратно в int, если оно было целым (счетчики населения и т.п.)."""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def load_snapshot(path):
+    data = np.load(path)
+    if int(data['version']) != SNAPSHOT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия снимка: {int(data['version'])}")
+
+    width, height = (int(v) for v in data['size'])
+    world = World(width, height, arrays=(
+        array('B', data['resource_codes'].tobytes()),
+        array('d', data['resource_amounts'].tobytes()),
+        array('i', data['owner_ids'].tobytes()),
+        array('B', data['radioactive'].tobytes()),
+    ))
+    world.timers.restore(int(data['timers_now']), data['timers'].tolist())
+    sim = Simulation(world=world)
+    sim.tick = int(data['tick'])
+    rng_version, rng_gauss = data['rng_meta']
+    sim.rng.setstate((int(rng_version), tuple(int(v) for v in data['rng_state']),
+                      None if np.isnan(rng_gauss) else float(rng_gauss)))
+
+    # Люди
+    humans = []
+    for (x, y), (hunger, thirst, age, lifespan), res, goal, active in zip(
+            data['human_pos'], data['human_needs'], data['human_resources'], data['human_goal'], data['human_active']):
+        h = Human.__new__(Human)
+        h.x, h.y = int(x), int(y)
+        h.state = "searching_partner"
+        h.hunger, h.thirst, h.age, h.lifespan = _number(hunger), _number(thirst), _number(age), float(lifespan)
+        h.resources = Resources(_number(v) for v in res)
+        h.goal = HUMAN_GOALS[goal]
+        h.active = bool(active)
+        humans.append(h)
+    for h, kind, ref in zip(humans, data['human_target_kind'], data['human_target_ref']):
+        h.target = _decode_target(world, humans, kind, ref)
+    sim.humans = humans[:int(data['humans_listed'])]
+
+    # Группы
+    groups = []
+    for (x, y), (population, capacity, progress), res, state in zip(
+            data['group_pos'], data['group_values'], data['group_resources'], data['group_state']):
+        g = Group.__new__(Group)
+        g.x, g.y = int(x), int(y)
+        g.population, g.inventory_capacity, g.reproduction_progress = _number(population), _number(capacity), _number(progress)
+        g.resources = Resources(_number(v) for v in res)
+        g.state = GROUP_STATES[state]
+        groups.append(g)
+    for g, kind, ref in zip(groups, data['group_target_kind'], data['group_target_ref']):
+        g.target = _decode_target(world, groups, kind, ref)
+    sim.groups = groups[:int(data['groups_listed'])]
+
+    # Поселения и государства
+    settlements = []
+    offsets = data['territory_offsets']
+    for i, (kind, (x, y), values, res) in enumerate(zip(
+            data['settlement_kind'], data['settlement_pos'], data['settlement_values'], data['settlement_resources'])):
+        cls = SETTLEMENT_KINDS[kind]
+        s = cls.__new__(cls)
+        s.type = cls.__name__
+        s.x, s.y = int(x), int(y)
+        population, add_amount, gather_radius, progress_to_city, progress_to_state = values
+        s.population, s.add_population_amount, s.gather_radius = _number(population), _number(add_amount), _number(gather_radius)
+        s.progress_to_city = _number(progress_to_city)
+        if cls is not Tribe: s.progress_to_state = _number(progress_to_state)
+        s.resources = Resources(_number(v) for v in res)
+        s.territory = Territory(world, (world.get_tile(*divmod(int(t), height)) for t in data['territory_flat'][offsets[i]:offsets[i + 1]]))
+        settlements.append(s)
+
+    first_state = len(settlements) - len(data['state_values'])
+    states = settlements[first_state:]
+    border_offsets = data['border_offsets']
+    for i, (s, color, values) in enumerate(zip(states, data['state_color'], data['state_values'])):
+        s.color = tuple(int(c) for c in color)
+        s.technology_lvl, s.nuclear_bomb, s.nuclear_progress, s.starting_nuclear_war = (_number(v) for v in values)
+        s.diplomacy = {}
+        s.border_tiles = {world.get_tile(*divmod(int(t), height)): None
+                          for t in data['border_flat'][border_offsets[i]:border_offsets[i + 1]]}
+        s.reset_power_cache()
+    for a, b, status in data['diplomacy']:
+        states[a].diplomacy[states[b]] = DIPLOMACY_STATUSES[status]
+
+    for s in states[:int(data['states_registered'])]:
+        world.state_id(s)
+    sim.settlements = [settlements[i] for i in data['settlement_order']]
+    sim.states = [states[i] for i in data['state_order']]
+    if len(data['lod_meta']):
+        steps, *focus = (int(v) for v in data['lod_meta'])
+        sim.use_lod(None if focus[0] < 0 else tuple(focus))
+        sim.lod.steps = steps
+        for (rx, ry), (humans_count, groups_count, population, *res) in zip(data['lod_regions'].tolist(), data['lod_values'].tolist()):
+            sim.lod.aggregates[(rx, ry)] = RegionAggregate(_number(humans_count), _number(groups_count), _number(population),
+                                                           Resources(_number(v) for v in res))
+        sim.lod.active_until = {(rx, ry): until for rx, ry, until in data['lod_active'].tolist()}
+    world.occupancy.rebuild(sim)
+    return sim
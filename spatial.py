@@ -0,0 +1,50 @@
+import numpy as np
+from geometry import distance_rings
+
+
+class SpatialHash:
+    """Равномерная сетка для поиска соседей: ячейка (cx, cy) -> список объектов.
+    Объекты из items кладутся по своим x, y, остальные - по координатам, переданным в insert."""
+    def __init__(self, cell_size, items=()):
+        self.cell_size = cell_size
+        self.cells = {}
+        for item in items: self.insert(item.x, item.y, item)
+
+    def insert(self, x, y, item):
+        key = (int(x // self.cell_size), int(y // self.cell_size))
+        self.cells.setdefault(key, []).append(item)
+
+    def query(self, x, y, radius):
+        """Объекты из ячеек, покрывающих квадрат радиуса radius (расстояние проверяет вызывающий)."""
+        size = self.cell_size
+        for cx in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            for cy in range(int((y - radius) // size), int((y + radius) // size) + 1):
+                cell = self.cells.get((cx, cy))
+                if cell: yield from cell
+
+
+def near_mask(points, others, radius, same=False):
+    """Для каждой клетки points (список пар (x, y)) - есть ли клетка из others строго ближе radius.
+    same - others и есть points, и точка сама себе соседом не считается. Все точки проверяются
+    разом по отсортированным ключам клеток, чтобы сетку опрашивали только те, у кого соседи есть."""
+    if not points or not others: return [False] * len(points)
+    p, o = np.array(points, dtype=np.int64), np.array(others, dtype=np.int64)
+    # Ключ клетки с запасом radius по y, чтобы смещения не переходили в соседний столбец
+    span = int(max(p[:, 1].max(), o[:, 1].max())) + 2 * radius + 1
+    # Запросы идут по возрастанию: так двоичный поиск numpy сужается от предыдущего ключа
+    keys = p[:, 0] * span + p[:, 1] + radius
+    order = np.argsort(keys)
+    keys = keys[order]
+    occupied, counts = np.unique(o[:, 0] * span + o[:, 1] + radius, return_counts=True)
+    found = np.zeros(len(p), dtype=bool)
+    for d2, ring in distance_rings(radius):
+        for dx, dy in ring:
+            query = keys + dx * span + dy
+            slot = np.minimum(np.searchsorted(occupied, query), len(occupied) - 1)
+            hit = occupied[slot] == query
+            # На своей клетке сосед есть, только если там стоит кто-то еще
+            if same and d2 == 0: hit &= counts[slot] > 1
+            found |= hit
+    result = np.empty_like(found)
+    result[order] = found
+    return result.tolist()
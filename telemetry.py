@@ -0,0 +1,77 @@
+"""Потоковая телеметрия шагов симуляции.
+
+Раз в interval шагов снимается строка метрик: численность по ступеням (люди, группы,
+племена, города, государства), запасы ресурсов на карте, размеры территорий, войны,
+ядерные арсеналы и длительность шага. Строки копятся в буфере и дописываются в CSV
+пачками по TELEMETRY_FLUSH_ROWS, а последние TELEMETRY_RING_SIZE строк всегда
+доступны в памяти для живых графиков."""
+import csv
+import os
+from collections import deque
+import numpy as np
+from config import *
+from settlement import Tribe, City, State
+
+METRICS = (
+    'step', 'tick', 'step_ms',
+    'humans', 'groups', 'tribes', 'cities', 'states',
+    'group_population', 'tribe_population', 'city_population', 'state_population',
+    *(f'map_{res}' for res in RESOURCE_TYPES),
+    'state_territory', 'largest_territory', 'radioactive_tiles',
+    'wars', 'nuclear_bombs',
+)
+
+
+class Telemetry:
+    def __init__(self, path=None, interval=1, ring_size=TELEMETRY_RING_SIZE, flush_rows=TELEMETRY_FLUSH_ROWS):
+        """path - CSV для дозаписи (None - только кольцевой буфер); interval - шагов между замерами."""
+        self.path = path
+        self.interval = max(1, interval)
+        self.flush_rows = flush_rows
+        self.ring = deque(maxlen=ring_size)
+        self.pending = []
+        self.steps = 0
+
+    def sample(self, sim, seconds):
+        """Вызывается после каждого шага; строку снимает раз в interval шагов."""
+        self.steps += 1
+        if self.steps % self.interval: return
+        row = self.collect(sim, seconds)
+        self.ring.append(row)
+        if self.path:
+            self.pending.append(row)
+            if len(self.pending) >= self.flush_rows: self.flush()
+
+    def collect(self, sim, seconds):
+        world = sim.world
+        tiers = {Tribe: [], City: [], State: []}
+        for s in sim.settlements: tiers[type(s)].append(s)
+        states = sim.states
+        territories = [len(s.territory) for s in states]
+        resources = np.bincount(world.codes_view, weights=np.maximum(world.amounts_view, 0), minlength=len(RESOURCE_TYPES))
+        # Война записана у обеих сторон
+        wars = sum(status == 'war' for s in states for status in s.diplomacy.values()) // 2
+        return (
+            self.steps, sim.tick, round(seconds * 1000, 3),
+            len(sim.humans), len(sim.groups), len(tiers[Tribe]), len(tiers[City]), len(tiers[State]),
+            sum(g.population for g in sim.groups), *(sum(s.population for s in tiers[cls]) for cls in (Tribe, City, State)),
+            *resources.tolist(),
+            sum(territories), max(territories, default=0), int(np.count_nonzero(np.frombuffer(world.radioactive, dtype=np.uint8))),
+            wars, sum(s.nuclear_bomb for s in states),
+        )
+
+    def series(self, metric):
+        """Значения метрики из кольцевого буфера (от старых к новым)."""
+        column = METRICS.index(metric)
+        return [row[column] for row in self.ring]
+
+    def flush(self):
+        if not self.pending: return
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file: writer.writerow(METRICS)
+            writer.writerows(self.pending)
+        self.pending = []
+
+    def close(self): self.flush()
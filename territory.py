@@ -0,0 +1,40 @@
+import numpy as np
+
+
+class Territory:
+    """Множество клеток поселения с порядком для случайного выбора и кэшем индексов в массивах World.
+    Добавление, удаление и проверка принадлежности - O(1)."""
+    __slots__ = ('world', 'tiles', 'positions', '_indices')
+
+    def __init__(self, world=None, tiles=()):
+        self.world = world
+        self.tiles = []
+        self.positions = {} # клетка -> позиция в self.tiles
+        self._indices = None
+        for tile in tiles: self.append(tile)
+
+    def __len__(self): return len(self.tiles)
+    def __iter__(self): return iter(self.tiles)
+    def __getitem__(self, i): return self.tiles[i]
+    def __contains__(self, tile): return tile in self.positions
+
+    def append(self, tile):
+        if tile in self.positions: return
+        self.positions[tile] = len(self.tiles)
+        self.tiles.append(tile)
+        self._indices = None
+
+    def remove(self, tile):
+        # На место удаляемой клетки встает последняя
+        pos = self.positions.pop(tile)
+        last = self.tiles.pop()
+        if last is not tile:
+            self.tiles[pos] = last
+            self.positions[last] = pos
+        self._indices = None
+
+    def indices(self):
+        """Индексы клеток в массивах World (numpy-массив, пересчитывается после изменений)."""
+        if self._indices is None:
+            self._indices = np.fromiter((t.index for t in self.tiles), dtype=np.intp, count=len(self.tiles))
+        return self._indices
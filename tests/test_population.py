@@ -0,0 +1,31 @@
+"""Пакетный режим (--population) должен идти шаг в шаг с обычными объектами Human."""
+import contextlib
+import io
+
+import pytest
+
+from config import *
+from simulation import Simulation
+
+
+def trajectory(batched, paths=False, steps=40):
+    sim = Simulation(160, 120, seed=3)
+    if batched: sim.use_population()
+    if paths: sim.use_paths()
+    sim.spawn_humans(3000)
+    states = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(steps):
+            sim.update(TICK_STEP)
+            humans = [(h.x, h.y, h.hunger, h.thirst, h.age, list(h.resources), h.goal) for h in sim.humans]
+            groups = [(g.x, g.y, g.population, list(g.resources)) for g in sim.groups]
+            states.append((humans, groups, len(sim.settlements)))
+    return states
+
+
+@pytest.mark.parametrize('paths', [False, True])
+def test_batched_matches_objects(paths):
+    scalar, batched = trajectory(False, paths), trajectory(True, paths)
+    for step, (expected, actual) in enumerate(zip(scalar, batched)):
+        assert actual == expected, f"режимы разошлись на шаге {step}"
+    assert scalar[-1][1], "к концу прогона должны появиться группы"
@@ -1,23 +1,48 @@
-import random
 import pygame
 from config import *
 
 class Tile:
-    """Представляет клетку мира."""
-    def __init__(self, x, y):
+    """Представляет клетку мира: легкое представление над массивами World.
+    Запись свойств идет через World, который рассылает события об изменениях клетки."""
+    __slots__ = ('world', 'x', 'y', 'index')
+
+    def __init__(self, world, x, y):
+        self.world = world
         self.x, self.y = x, y
-        self.resource_type = random.choice(['food', 'water', 'wood', 'stone'])
-        self.resource_amount = random.randint(MAX_RESOURCE_PER_TILE // 2, MAX_RESOURCE_PER_TILE)
-        self.color = COLORS[self.resource_type]
-        self.rect = pygame.Rect(self.x * TILE_SIZE, self.y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-        self.owner_state = None
-        self.radioactive = False
+        self.index = world.tile_index(x, y)
+
+    # Хеш по индексу клетки: порядок обхода множеств клеток не зависит от адресов в памяти
+    def __hash__(self): return self.index
+
+    @property
+    def resource_type(self): return RESOURCE_TYPES[self.world.resource_codes[self.index]]
+
+    @property
+    def resource_code(self): return self.world.resource_codes[self.index]
+
+    @property
+    def resource_amount(self): return self.world.resource_amounts[self.index]
+
+    @resource_amount.setter
+    def resource_amount(self, value): self.world.set_amount(self.index, value)
+
+    @property
+    def owner_state(self): return self.world.state_by_id[self.world.owner_ids[self.index]]
+
+    @owner_state.setter
+    def owner_state(self, state): self.world.set_owner(self.index, state)
+
+    @property
+    def radioactive(self): return bool(self.world.radioactive[self.index])
+
+    @radioactive.setter
+    def radioactive(self, value): self.world.set_radioactive(self.index, value)
+
+    @property
+    def color(self): return COLORS[self.resource_type]
+
+    @property
+    def rect(self): return pygame.Rect(self.x * TILE_SIZE, self.y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
 
     def draw(self, surface):
-        if self.radioactive:
-            pygame.draw.rect(surface, (57, 255, 20), self.rect)
-        elif self.owner_state:
-            color = self.owner_state.color
-            pygame.draw.rect(surface, (int(color[0]*0.7), int(color[1]*0.7), int(color[2]*0.7)), self.rect)
-        else:
-            pygame.draw.rect(surface, self.color, self.rect)
\ No newline at end of file
+        pygame.draw.rect(surface, self.world.tile_color(self.index), self.rect)
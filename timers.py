@@ -0,0 +1,38 @@
+from config import *
+
+
+class TimerWheel:
+    """Колесо таймеров по шагам симуляции.
+
+    Таймер со сроком due лежит в корзине due % slots; за шаг просматривается одна
+    корзина, поэтому стоимость шага не зависит от того, сколько таймеров ждет дальше.
+    Таймеры дальше одного оборота колеса просто остаются в корзине до своего срока."""
+    def __init__(self, slots=TIMER_WHEEL_SLOTS, now=0):
+        self.now = now
+        self.slots = [[] for _ in range(slots)]
+
+    def __len__(self): return sum(len(slot) for slot in self.slots)
+
+    def schedule(self, delay, kind, index):
+        due = self.now + max(1, delay)
+        self.slots[due % len(self.slots)].append((due, kind, index))
+
+    def advance(self):
+        """Переходит на следующий шаг; возвращает сработавшие таймеры (kind, index) в порядке постановки."""
+        self.now += 1
+        pos = self.now % len(self.slots)
+        slot = self.slots[pos]
+        if not slot: return []
+        fired = [(kind, index) for due, kind, index in slot if due == self.now]
+        if fired: self.slots[pos] = [timer for timer in slot if timer[0] != self.now]
+        return fired
+
+    def entries(self):
+        """Все таймеры (due, kind, index): по корзинам, внутри - в порядке постановки."""
+        return [timer for slot in self.slots for timer in slot]
+
+    def restore(self, now, entries):
+        self.now = now
+        self.slots = [[] for _ in self.slots]
+        for due, kind, index in entries:
+            self.slots[due % len(self.slots)].append((due, kind, index))
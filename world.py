@@ -1,43 +1,243 @@
+import random
+from array import array
+import numpy as np
+import pygame
 from tile import Tile
+from timers import TimerWheel
+from occupancy import Occupancy
+from geometry import square_offsets, disc_offsets, distance_rings
+from config import *
 
 
-class World:
-    """Управляет всеми клетками (тайлами) мира."""
+# События клеток мира: подписчики получают индекс клетки
+TILE_DEPLETED, TILE_REPLENISHED, TILE_OWNER_CHANGED, TILE_IRRADIATED, TILE_DECONTAMINATED = range(5)
+TILE_EVENTS = range(5)
+# Виды таймеров мира
+TIMER_REGROW, TIMER_DECAY = range(2)
+
+
+class MapCanvas:
+    """Заранее отрисованная карта: перекрашиваются только клетки с новыми цветами."""
     def __init__(self, width, height):
+        self.height = height
+        self.surface = pygame.Surface((width * TILE_SIZE, height * TILE_SIZE))
+
+    def paint(self, colors):
+        """colors - индекс клетки -> цвет (как из World.take_colors)."""
+        for i, color in colors.items():
+            x, y = divmod(i, self.height)
+            pygame.draw.rect(self.surface, color, (x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+
+    def draw(self, surface): surface.blit(self.surface, (0, 0))
+
+
+class World:
+    """Управляет всеми клетками (тайлами) мира.
+
+    Клетки хранятся столбцами в плоских массивах (индекс x * height + y),
+    а Tile - лишь представление над ними, создаваемое при первом обращении."""
+    def __init__(self, width, height, rng=random, arrays=None):
+        """rng - источник случайности симуляции; arrays - готовые столбцы
+        (resource_codes, resource_amounts, owner_ids, radioactive), например из снимка."""
         self.width, self.height = width, height
-        self.grid = [[Tile(x, y) for y in range(height)] for x in range(width)]
+        self.rng = rng
+        size = width * height
+        if arrays is None:
+            self.resource_codes = array('B', bytes(size)) # индекс в RESOURCE_TYPES
+            self.resource_amounts = array('d', bytes(8 * size))
+            self.owner_ids = array('i', bytes(4 * size)) # 0 - ничья клетка
+            self.radioactive = array('B', bytes(size))
+            for i in range(size):
+                self.resource_codes[i] = rng.randrange(len(RESOURCE_TYPES))
+                self.resource_amounts[i] = rng.randint(MAX_RESOURCE_PER_TILE // 2, MAX_RESOURCE_PER_TILE)
+            arrays = (self.resource_codes, self.resource_amounts, self.owner_ids, self.radioactive)
+        self.bind_arrays(*arrays)
+        self.state_by_id = [None]
+        self.state_ids = {None: 0}
+        self.tiles = [None] * size
+        # Общие для всех поселений таблицы соседей: радиус -> {индекс клетки: кортеж соседей}.
+        # Смещения готовы заранее, кортежи появляются при первом запросе клетки - память
+        # уходит только на клетки, у которых соседей спрашивали.
+        self.neighbor_tables = {radius: {} for radius in NEIGHBOR_RADII}
+        for radius in NEIGHBOR_RADII: square_offsets(radius)
+        self.build_resource_index()
+        self.canvas = None # заранее отрисованная карта для draw
+        self.dirty_tiles = set() # индексы клеток, чей цвет изменился с последней отрисовки
+        self.timers = TimerWheel() # восстановление ресурсов и распад радиации
+        self.occupancy = Occupancy() # кто стоит на клетке; ведет Simulation
+        self.paths = None # поля расстояний к ресурсам (pathfinding.FlowFields), см. Simulation.use_paths
+        # Индекс ресурсов, кэш отрисовки и таймеры узнают об изменениях клеток из событий,
+        # а не повторными проверками
+        self.listeners = [[] for _ in TILE_EVENTS]
+        self.subscribe(TILE_DEPLETED, self.unindex)
+        self.subscribe(TILE_REPLENISHED, self.index_tile)
+        for event in (TILE_OWNER_CHANGED, TILE_IRRADIATED, TILE_DECONTAMINATED):
+            self.subscribe(event, self.dirty_tiles_add)
+        self.subscribe(TILE_DEPLETED, lambda i: self.timers.schedule(RESOURCE_REGROW_DELAY, TIMER_REGROW, i))
+        self.subscribe(TILE_IRRADIATED, lambda i: self.timers.schedule(RADIATION_DECAY_DELAY, TIMER_DECAY, i))
+
+    def bind_arrays(self, codes, amounts, owners, radioactive):
+        """Переключает мир на другие буферы столбцов (например, в общей памяти процессов)."""
+        self.resource_codes, self.resource_amounts, self.owner_ids, self.radioactive = codes, amounts, owners, radioactive
+        # numpy-представления тех же буферов для векторных операций по карте
+        self.codes_view = np.frombuffer(codes, dtype=np.uint8)
+        self.amounts_view = np.frombuffer(amounts, dtype=np.float64)
+
+    # --- События и таймеры ---
+    def subscribe(self, event, callback):
+        """callback(index) вызывается при каждом событии event с клеткой index."""
+        self.listeners[event].append(callback)
+
+    def emit(self, event, i):
+        for callback in self.listeners[event]: callback(i)
+
+    def dirty_tiles_add(self, i): self.dirty_tiles.add(i)
+
+    def set_amount(self, i, value):
+        old = self.resource_amounts[i]
+        self.resource_amounts[i] = value
+        if old > 0 >= value: self.emit(TILE_DEPLETED, i)
+        elif value > 0 >= old: self.emit(TILE_REPLENISHED, i)
+
+    def set_owner(self, i, state):
+        sid = self.state_id(state)
+        old = self.owner_ids[i]
+        if old != sid:
+            self.owner_ids[i] = sid
+            # Граница государства зависит только от того, его ли соседние клетки,
+            # поэтому пересчитывать ее нужно у прежнего и нового владельца
+            tile = self.get_tile(*divmod(i, self.height))
+            for owner in (self.state_by_id[old], state):
+                if owner: owner.refresh_border(self, tile)
+            self.emit(TILE_OWNER_CHANGED, i)
+
+    def set_radioactive(self, i, value):
+        if bool(self.radioactive[i]) != bool(value):
+            self.radioactive[i] = bool(value)
+            self.emit(TILE_IRRADIATED if value else TILE_DECONTAMINATED, i)
+
+    def advance(self):
+        """Шаг мира: срабатывают таймеры восстановления ресурсов и распада радиации."""
+        for kind, i in self.timers.advance():
+            if kind == TIMER_DECAY:
+                self.set_radioactive(i, False)
+            elif self.radioactive[i]:
+                # На зараженной клетке ничего не растет: ждем еще
+                self.timers.schedule(RESOURCE_REGROW_DELAY, TIMER_REGROW, i)
+            elif self.resource_amounts[i] <= 0:
+                self.set_amount(i, RESOURCE_REGROW_AMOUNT)
+
+    def tile_index(self, x, y): return x * self.height + y
 
     def get_tile(self, x, y):
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.grid[x][y]
+            i = x * self.height + y
+            tile = self.tiles[i]
+            if tile is None:
+                tile = self.tiles[i] = Tile(self, x, y)
+            return tile
         return None
 
+    def state_id(self, state):
+        """Номер государства в owner_ids (выдается при первой встрече)."""
+        sid = self.state_ids.get(state)
+        if sid is None:
+            sid = self.state_ids[state] = len(self.state_by_id)
+            self.state_by_id.append(state)
+        return sid
+
+    def tile_color(self, i):
+        if self.radioactive[i]:
+            return (57, 255, 20)
+        state = self.state_by_id[self.owner_ids[i]]
+        if state:
+            color = state.color
+            return (int(color[0]*0.7), int(color[1]*0.7), int(color[2]*0.7))
+        return COLORS[RESOURCE_TYPES[self.resource_codes[i]]]
+
     def get_neighbors(self, tile, radius=1):
-        neighbors = []
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                if dx == 0 and dy == 0: continue
-                nx, ny = tile.x + dx, tile.y + dy
-                neighbor_tile = self.get_tile(nx, ny)
-                if neighbor_tile:
-                    neighbors.append(neighbor_tile)
+        """Соседи клетки в квадрате радиуса radius (неизменяемый кортеж, общий для всех вызовов)."""
+        table = self.neighbor_tables.get(radius)
+        if table is None: table = self.neighbor_tables[radius] = {}
+        neighbors = table.get(tile.index)
+        if neighbors is None:
+            x, y = tile.x, tile.y
+            neighbors = table[tile.index] = tuple(
+                n for n in (self.get_tile(x + dx, y + dy) for dx, dy in square_offsets(radius)) if n)
         return neighbors
 
+    # --- Пространственный индекс ресурсов ---
+    # Для каждого типа ресурса - число непустых клеток в корзинах RESOURCE_INDEX_CELL x RESOURCE_INDEX_CELL:
+    # массив (тип, bx, by). Сами клетки ищутся по массивам мира только там, где счетчик не нулевой.
+    def build_resource_index(self):
+        cell = RESOURCE_INDEX_CELL
+        bw, bh = -(-self.width // cell), -(-self.height // cell)
+        i = np.flatnonzero(self.amounts_view > 0)
+        keys = (self.codes_view[i].astype(np.int64) * bw + i // self.height // cell) * bh + i % self.height // cell
+        self.resource_index = np.bincount(keys, minlength=len(RESOURCE_TYPES) * bw * bh).astype(np.int32) \
+            .reshape(len(RESOURCE_TYPES), bw, bh)
+
+    def index_tile(self, i):
+        self.resource_index[self.resource_codes[i], i // self.height // RESOURCE_INDEX_CELL,
+                            i % self.height // RESOURCE_INDEX_CELL] += 1
+
+    def unindex(self, i):
+        self.resource_index[self.resource_codes[i], i // self.height // RESOURCE_INDEX_CELL,
+                            i % self.height // RESOURCE_INDEX_CELL] -= 1
+
+    def resource_count(self, code, x0, y0, x1, y1):
+        """Непустые клетки типа code в корзинах, покрывающих прямоугольник [x0, x1) x [y0, y1)
+        (клетки вне него тоже считаются); None, если индекс не ведется."""
+        if self.resource_index is None: return None
+        cell = RESOURCE_INDEX_CELL
+        return int(self.resource_index[code, max(x0, 0) // cell:(x1 - 1) // cell + 1,
+                                       max(y0, 0) // cell:(y1 - 1) // cell + 1].sum())
+
+    def resource_tiles(self, code, x0, y0, x1, y1):
+        """Индексы непустых клеток типа code в прямоугольнике [x0, x1) x [y0, y1), обрезанном по карте."""
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, self.width), min(y1, self.height)
+        shape = (self.width, self.height)
+        codes = self.codes_view.reshape(shape)[x0:x1, y0:y1]
+        amounts = self.amounts_view.reshape(shape)[x0:x1, y0:y1]
+        xs, ys = np.nonzero((codes == code) & (amounts > 0))
+        return ((xs + x0) * self.height + ys + y0).tolist()
+
+    def find_nearest_resource(self, x, y, resource_type, radius):
+        """Ближайшая клетка типа resource_type с ресурсом > 0 строго ближе radius.
+        При равных расстояниях выбирается клетка с меньшими (x, y), как при обходе grid."""
+        code = RESOURCE_IDS[resource_type]
+        # Индекс отсекает окрестности без ресурса, иначе обходим кольца до первой подходящей клетки
+        if self.resource_count(code, x - radius + 1, y - radius + 1, x + radius, y + radius) == 0: return None
+        codes, amounts, width, height = self.resource_codes, self.resource_amounts, self.width, self.height
+        for d2, ring in distance_rings(radius):
+            # Кольцо идет по возрастанию (dx, dy): первая найденная клетка - с меньшими (x, y)
+            for dx, dy in ring:
+                tx, ty = x + dx, y + dy
+                if 0 <= tx < width and 0 <= ty < height:
+                    i = tx * height + ty
+                    if codes[i] == code and amounts[i] > 0: return self.get_tile(tx, ty)
+        return None
+
+    def take_colors(self, full=False):
+        """Цвета клеток, изменившихся с прошлого вызова (full - всех клеток): индекс -> цвет."""
+        indices = range(self.width * self.height) if full else self.dirty_tiles
+        colors = {i: self.tile_color(i) for i in indices}
+        self.dirty_tiles = set()
+        return colors
+
     def draw(self, surface):
-        for row in self.grid:
-            for tile in row:
-                tile.draw(surface)
+        # Карта рисуется целиком один раз, дальше перерисовываются только изменившиеся клетки
+        full = self.canvas is None
+        if full: self.canvas = MapCanvas(self.width, self.height)
+        self.canvas.paint(self.take_colors(full))
+        self.canvas.draw(surface)
     
     def nuclear_explosion(self, target_tile, radius=7):
         affected_tiles = []
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                distance = (dx**2 + dy**2)**0.5
-                if distance <= radius:
-                    nx, ny = target_tile.x + dx, target_tile.y + dy
-                    tile = self.get_tile(nx, ny)
-                    if tile:
-                        affected_tiles.append(tile)
+        for dx, dy in disc_offsets(radius):
+            tile = self.get_tile(target_tile.x + dx, target_tile.y + dy)
+            if tile:
+                affected_tiles.append(tile)
 
         state_tiles = 0
         for tile in affected_tiles:
@@ -47,7 +247,8 @@ class World:
                 state_tiles += 1
                 tile.owner_state.population *= 1 - (state_tiles / len(tile.owner_state.territory))
                 tile.owner_state.starting_nuclear_war = 1
+                state = tile.owner_state
+                state.mark_power_dirty()
                 tile.owner_state = None
 
         print(f"💥 Ядерный взрыв уничтожил {state_tiles} государственных клеток!")
-        
\ No newline at end of file